@@ -6,8 +6,18 @@ from helpers import (
     validStaffConstraint,
     constraintType,
     Employee,
+    employeeById,
+    asScheduleState,
+    CandidateBatch,
+    FlowNetwork,
+    TranspositionTable,
+    ScheduleState,
+    canWorkDay,
+    UNFILLED_ID,
 )
 import math
+import heapq
+import time
 
 ABS_PENALTY = 10000
 EPOCH_LIMIT = 1000
@@ -15,153 +25,294 @@ SHIFTLENGTH = 12  # hours
 TEMPERATURE = 1000
 COOLING = 0.9995
 PATIENCE = 300
+CONSTRUCTION = 'anneal'  # greedy phase: 'anneal' (greedySearch), 'regret' (regretConstruction), 'tempering' (temperingSearch),
+                         # 'tabu' (tabuSearch), 'lns' (lnsSearch), 'exact' (exactSearch), 'flow' (flowConstruction)
+                         # or 'none' (keep the input as it is and only repair it)
+REPLICAS = 4  # parallel tempering chains, one per rung of the temperature ladder
+COLDEST = 10  # temperature of the coldest rung, the hottest runs at TEMPERATURE
+EXCHANGE_EVERY = 10  # epochs between replica exchange rounds
+TABU_TENURE = 12  # iterations an employee may not return to a slot they were moved out of
+TABU_PATIENCE = 60  # tabu iterations without a new best before the search stops
+LNS_TIME_BUDGET = 30  # seconds of large-neighbourhood search
+BNB_TIME_LIMIT = 60  # seconds the exact search may run before it settles for the best schedule found
+TRANSPOSITION_SIZE = 4096  # scored schedules remembered by hash, least recently used dropped first
 
 # agent tasked with solving constraint satisfaction problem
 # uses greedy search with simulated annealing, followed by local repair and local search
 class Solver:
     def __init__(self, balancer: ScheduleBalancer, daypool: list[Employee],
-                 nightpool: list[Employee], floatpool: list[Employee], unfilled: Employee):
+                 nightpool: list[Employee], floatpool: list[Employee], unfilled: Employee, seed=None):
         self.balancer = balancer
-        self.state = balancer.state
+        # source of every random choice, a seed gives the run its own generator so it can be reproduced
+        self.random = random if seed is None else random.Random(seed)
+        self.state = asScheduleState(balancer.state)
+        self.balancer.state = self.state
         self.dayPool = daypool
         self.nightPool = nightpool
         self.floatPool = floatpool
         self.unfilled = unfilled
         self.allPool = list({*daypool, *nightpool, *floatpool})
 
-        self.hours_used = self._calculate_hours_used(self.state)
+        self._build_candidates()
+
+        # open slots kept in a heap by slot_order's key, re-keyed only where a move could change them
+        self.slot_ranks = self._slot_ranks()
+        self.slots_in_week = {}
+        for slot in self.slot_ranks:
+            self.slots_in_week.setdefault(slot[0], []).append(slot)
+        self._slot_heap, self._slot_live, self._slot_watch = [], {}, [None, None]
+
+        # slots that count as holes when unfilled, D2 is downstaffed on Tue/Fri and weekends
+        self.required = np.ones(self.state.shape, dtype=bool)
+        self.required[:, [weekdays.Tuesday.value, weekdays.Friday.value,
+                          weekdays.Saturday.value, weekdays.Sunday.value], 1] = False
+
+        # violation counts of schedules already scored, by Zobrist hash, see _counts
+        self.transpositions = TranspositionTable(TRANSPOSITION_SIZE)
         self.current_score = self.score(self.state)
         self.lastRejected = None
 
         self.temperature = TEMPERATURE
         self.cooling_rate = COOLING
 
-    # dict table of hours used per pay for each employee, used to check valid assignments
-    def _calculate_hours_used(self, schedule: np.ndarray) -> dict:
-        hours = {w: {emp: 0 for emp in self.allPool} for w in range(schedule.shape[0])}
-        W, D, S = schedule.shape
-        for w in range(W):
-            for d in range(D):
-                for s in range(S):
-                    emp = schedule[w, d, s]
-                    if emp is not self.unfilled:
-                        hours[w][emp] += SHIFTLENGTH
-        return hours
-    
-    # find most appropriate employee to fill a slot
-    def _select_employee_for_slot(self, schedule, w, d, s, hours_map):
-        best_candidate = self.unfilled
-        best_combined = float('inf')
+    # start the search over from a copy of schedule, keeping the roster and the caches (they resync from the grid)
+    def reset(self, schedule):
+        self.state = asScheduleState(np.array(schedule))
+        self.balancer.state = self.state
+        self.current_score = self.score(self.state)
+        self.lastRejected = None
+        self.temperature = TEMPERATURE
 
-        original_emp = schedule[w, d, s]
+    # vectorised scoring of every employee for a slot (see _ranked_candidates), restricted per shift to its
+    # static domain, rebuild if allPool or the roster's constraints change
+    def _build_candidates(self):
+        self.candidates = CandidateBatch([emp for emp in self.allPool if emp is not self.unfilled])
+        self.hour_caps = self.candidates.limits(validStaffConstraint.HOURS_PER_PAY_PERIOD)
+        self.max_consec = self.candidates.limits(validStaffConstraint.CONSECUTIVE_DAYS)
+        self.domain = self._build_domains()
+        # (d, s) -> (positions in self.candidates, batch over just those employees), shared between equal domains
+        batches = {}
+        self.domain_batches = {}
+        for d, s in np.ndindex(*self.domain.shape[:2]):
+            positions = np.flatnonzero(self.domain[d, s, self.candidates.ids])
+            key = tuple(positions)
+            if key not in batches:
+                batches[key] = (positions, CandidateBatch([self.candidates.employees[p] for p in positions]))
+            self.domain_batches[(d, s)] = batches[key]
+        # employee id -> position in self.candidates, -1 for UNFILLED and anyone off the roster
+        self.position_of = np.full(self.domain.shape[2], -1, dtype=np.intp)
+        self.position_of[self.candidates.ids] = np.arange(len(self.candidates.ids))
+        self.solo_batches = [CandidateBatch([emp]) for emp in self.candidates.employees]
+
+        # dynamic feasibility, feasible[w, d, s, position] is True where that employee could be placed at (w, d, s)
+        # as the schedule stands, see _eligible; an entry is recomputed only once a change to that employee's
+        # shifts has marked it stale, and then lazily when its slot is next read
+        self.feasible = np.zeros((*self.state.shape, len(self.candidates.ids)), dtype=bool)
+        self._feasible_stale = np.ones(self.feasible.shape, dtype=bool)
+        watch = getattr(self, '_feasible_watch', None)
+        if watch and watch[0] is not None:
+            watch[0].unwatch(watch[1])
+        self._feasible_watch = [None, None]
+
+    # static candidate domains, domain[d, s, id] is False where that employee can never take that shift
+    # day shifts are open to the day and float pools, nights to the night and float pools, and absolute rules
+    # that fail whatever else is worked rule shifts out: CAN_WORK_X = False, no day/night shifts allowed
+    # at all, an OVERLOADED limit of 0 or a pay-period cap below one shift
+    def _build_domains(self):
+        D, S = self.state.shape[1:]
+        domain = np.zeros((D, S, max(emp.id for emp in self.allPool) + 1), dtype=bool)
+        for emp in {*self.dayPool, *self.floatPool}:
+            domain[:, 0:2, emp.id] = True
+        for emp in {*self.nightPool, *self.floatPool}:
+            domain[:, 2, emp.id] = True
+        domain[:, :, UNFILLED_ID] = False
 
         for emp in self.allPool:
-            if emp is self.unfilled:
-                continue
-
-            # Skip if already working this day
-            if emp in schedule[w, d, :]:
-                continue
-
-            # No day after night
-            if s in (0, 1):
-                if (d > 0 and schedule[w, d - 1, 2] is emp) or (d == 0 and w > 0 and schedule[w - 1, 6, 2] is emp):
+            for c in emp.absolute:
+                if c.key is None:
                     continue
+                if c.key.name.startswith('CAN_WORK_') and not bool(c.val):
+                    domain[canWorkDay(c.key), :, emp.id] = False
+                elif c.key is validStaffConstraint.DAYSHIFTS_PER_WEEK and c.val < 1:
+                    domain[:, 0:2, emp.id] = False
+                elif c.key is validStaffConstraint.NIGHTSHIFTS_PER_WEEK and c.val < 1:
+                    domain[:, 2, emp.id] = False
+                elif c.key is validStaffConstraint.OVERLOADED and not (0 < c.val):
+                    domain[:, :, emp.id] = False
+                elif c.key is validStaffConstraint.HOURS_PER_PAY_PERIOD and c.val < SHIFTLENGTH:
+                    domain[:, :, emp.id] = False
+        return domain
+
+    # True if the employee is in the static domain of the shift at (w, d, s), an empty slot always is
+    def in_domain(self, eid, w, d, s):
+        return eid == UNFILLED_ID or (eid < self.domain.shape[2] and self.domain[d, s, eid])
 
-            # Check hours cap
-            cap = next(c.val for c in emp.getConstraints()
-                    if c.name == validStaffConstraint.HOURS_PER_PAY_PERIOD.value)
-            pp_start = 2 * (w // 2)
-            used = sum(
-                SHIFTLENGTH
-                for w2 in (pp_start, pp_start + 1) if w2 < schedule.shape[0]
-                for d2 in range(schedule.shape[1])
-                for s2 in range(schedule.shape[2])
-                if schedule[w2, d2, s2] is emp
-            )
-            if used + SHIFTLENGTH > cap:
-                continue
-
-            # Tentatively assign
-            schedule[w, d, s] = emp
-
-            # Check hard violations
-            if any(not c.isSatisfied(schedule, w, d, s) and c.ctype == constraintType.ABSOLUTE
-                for c in emp.getConstraints()):
-                schedule[w, d, s] = original_emp
+    # find most appropriate employee to fill a slot
+    def _select_employee_for_slot(self, schedule, w, d, s):
+        ranked, _ = self._ranked_candidates(schedule, w, d, s)
+        return self.candidates.employees[ranked[0]] if len(ranked) else self.unfilled
+
+    # positions in self.candidates of everyone who can take the slot, best first, and their combined costs
+    # every employee in the shift's domain is scored at once: the lowest score change plus soft cost comes first,
+    # ties go to the employee with fewer hours in week w, then to the earlier one in allPool
+    # the score change leaves out the slot's current occupant and the global terms, which are the same for everyone
+    def _ranked_candidates(self, schedule, w, d, s):
+        positions, batch = self.domain_batches[(d, s)]
+        ids = batch.ids
+        evaluated = self._refresh_feasible(schedule, w, d, s)
+        eligible = self.feasible[w, d, s, positions]
+        if not eligible.any():
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.int64)
+        if evaluated is None:
+            evaluated = batch.evaluate(schedule, w, d, s)
+        _, abs_delta, rel_delta, soft_fails = evaluated
+
+        combined = abs_delta * ABS_PENALTY + rel_delta + \
+            self._soft_cost_eval(schedule, w, d, soft_fails, ids, self.max_consec[positions])
+
+        # Tiebreak: prefer less-used employee
+        pick = np.flatnonzero(eligible)
+        used_in_week = schedule.hoursInWeeks(ids[pick], w, w + 1)
+        ranked = pick[np.lexsort((pick, used_in_week, combined[pick]))]
+        return positions[ranked], combined[ranked]
+
+    # prefilter over ids for (w, d, s): off that day, not on the night before, and under their pay-period cap
+    def _eligible(self, schedule, w, d, s, ids, caps):
+        # Skip if already working this day
+        eligible = schedule.dayCount[ids, w, d] == 0
+
+        # No day after night
+        if s in (0, 1):
+            if d > 0:
+                eligible &= ids != schedule[w, d - 1, 2]
+            elif w > 0:
+                eligible &= ids != schedule[w - 1, 6, 2]
+
+        # Check hours cap
+        used = schedule.payPeriodHours(ids, w)
+        eligible &= ~(used + SHIFTLENGTH > caps)
+        return eligible
+
+    # bring feasible[w, d, s] up to date with schedule for the shift's domain
+    # returns the batch evaluation when one was needed, so _ranked_candidates does not evaluate twice
+    def _refresh_feasible(self, schedule, w, d, s):
+        self._sync_feasible(schedule)
+        positions, batch = self.domain_batches[(d, s)]
+        if not self._feasible_stale[w, d, s, positions].any():
+            return None
+        eligible = self._eligible(schedule, w, d, s, batch.ids, self.hour_caps[positions])
+        evaluated = None
+        # Check hard violations
+        if eligible.any():
+            evaluated = batch.evaluate(schedule, w, d, s)
+            eligible &= ~evaluated[0]
+        self.feasible[w, d, s, positions] = eligible
+        self._feasible_stale[w, d, s, positions] = False
+        return evaluated
+
+    # mark stale the entries a change to schedule can flip: an employee's feasibility depends only on their own
+    # shifts, so only their column in the affected weeks of each slot changed since the last sync (read from the
+    # state's dirty-slot feed) goes stale; a schedule other than the one followed so far makes everything stale
+    def _sync_feasible(self, schedule):
+        dirty = self._catch_up(self._feasible_watch, schedule)
+        if dirty is None:
+            self._feasible_stale[:] = True
+            return
+        for e, weeks in self._dirty_changes(dirty, schedule.grid).items():
+            if e < len(self.position_of) and self.position_of[e] >= 0:
+                self._feasible_stale[sorted(weeks), :, :, self.position_of[e]] = True
+
+    # slots of schedule changed since a cache last caught up with it, from the state's dirty-slot feed
+    # watch is the cache's [state, feed] pair; None when the cache was following another state object (or none
+    # yet), in which case it now follows schedule and has to rebuild
+    def _catch_up(self, watch, schedule):
+        if watch[0] is not schedule:
+            if watch[0] is not None:
+                watch[0].unwatch(watch[1])
+            watch[:] = [schedule, schedule.watch()]
+            return None
+        dirty = dict(watch[1])
+        watch[1].clear()
+        return dirty
+
+    # employee id -> weeks affected by the dirty slots whose id really changed, empty slots left out
+    def _dirty_changes(self, dirty, grid):
+        changes = {}
+        W = grid.shape[0]
+        for (w, d, s), before in dirty.items():
+            after = int(grid[w, d, s])
+            if after == before:
                 continue
-
-            # Compute score delta
-            trial_score = self.score(schedule)
-            schedule[w, d, s] = original_emp
-            delta = trial_score - self.current_score
-            softCost = self._soft_cost_eval(schedule, w, d, s, emp)
-            combined = delta + softCost  
-            
-            if combined < best_combined:
-                best_candidate = emp
-                best_combined   = combined
-
-            elif combined == best_combined:
-                # Tiebreak: prefer less-used employee
-                if hours_map[w].get(emp, 0) < hours_map[w].get(best_candidate, 9999):
-                    best_candidate = emp
-
-        #print(f"Selected {best_candidate.name} at {w}{d}{s} → ΔScore={best_delta}")
-        return best_candidate
-
-
-    # cost function for assigning employee with least number of relative conflicts
-    def _soft_cost_eval(self, schedule, w, d, s, emp):
-        orig = schedule[w, d, s]
-
-        # temp assignment for constraint checking
-        schedule[w, d, s] = emp
-        cost = 0
-        for c in emp.getConstraints():
-            if c.ctype == constraintType.RELATIVE and c.name != validStaffConstraint.MINIMUM_HOURS.value:
-                if not c.isSatisfied(schedule, w, d, s):
-                    cost += 2
+            for e in (before, after):
+                if e != UNFILLED_ID:
+                    changes.setdefault(e, set()).update(self._affected_weeks(e, w, d, W))
+        return changes
+
+    # True if employee eid could be placed at (w, d, s) of schedule, read from the feasibility tensor
+    def can_place(self, schedule, eid, w, d, s):
+        if eid == UNFILLED_ID or not self.in_domain(eid, w, d, s):
+            return False
+        self._refresh_feasible(schedule, w, d, s)
+        return bool(self.feasible[w, d, s, self.position_of[eid]])
+
+    # True if the employees at two filled slots of self.state could take each other's shift, that is each one
+    # is feasible at the other's slot once both have left their own
+    # when neither departure reaches the other slot's weeks the tensor already has the answer, otherwise both
+    # slots are emptied for a moment and the pair checked directly
+    def swap_feasible(self, w1, d1, s1, w2, d2, s2):
+        e1, e2 = int(self.state[w1, d1, s1]), int(self.state[w2, d2, s2])
+        if e1 == e2 or not (self.in_domain(e2, w1, d1, s1) and self.in_domain(e1, w2, d2, s2)):
+            return False
+        W = self.state.shape[0]
+        if w1 not in self._affected_weeks(e2, w2, d2, W) and w2 not in self._affected_weeks(e1, w1, d1, W):
+            return self.can_place(self.state, e2, w1, d1, s1) and self.can_place(self.state, e1, w2, d2, s2)
+
+        def placeable(eid, w, d, s):
+            pos = self.position_of[eid]
+            ids = self.candidates.ids[pos:pos + 1]
+            return bool(self._eligible(self.state, w, d, s, ids, self.hour_caps[pos:pos + 1])[0]) and \
+                not self.solo_batches[pos].evaluate(self.state, w, d, s)[0][0]
+
+        with self.state.untracked():
+            self.state[w1, d1, s1] = self.state[w2, d2, s2] = UNFILLED_ID
+            ok = placeable(e2, w1, d1, s1) and placeable(e1, w2, d2, s2)
+            self.state[w1, d1, s1], self.state[w2, d2, s2] = e1, e2
+        return ok
+
+    # cost function for assigning employee with least number of relative conflicts, over all candidates
+    # soft_fails counts the relative constraints (besides MINIMUM_HOURS) each candidate in ids would break at (w, d)
+    def _soft_cost_eval(self, schedule, w, d, soft_fails, ids, max_consec):
+        cost = 2 * soft_fails
         # adjacency bonus - bias toward working stretches of days
-        if (d > 0 and emp in schedule[w, d-1, :]) or (d < schedule.shape[1]-1 and emp in schedule[w, d+1, :]):
-            max_consec = next(
-                (c.val for c in emp.getConstraints()
-                if c.name == validStaffConstraint.CONSECUTIVE_DAYS.value),
-                None
-            )
-
-            if max_consec is not None:
-                prev_run = 0
-                dd = d-1
-                while dd >= 0 and any(schedule[w, dd, s] is emp for s in range(3)):
-                    prev_run += 1
-                    dd -= 1
-
-                next_run = 0
-                dd = d+1
-                D = schedule.shape[1]
-                while dd < D and any(schedule[w, dd, s] is emp for s in range(3)):
-                    next_run += 1
-                    dd += 1
-
-                total_run = prev_run + 1 + next_run
-
-                if total_run <= max_consec:
-                    cost -= 3000  # bonus = -3000 for runs
-
-        schedule[w, d, s] = orig
-        return cost
+        worked = schedule.dayCount[ids, w] > 0
+        D = schedule.shape[1]
+        prev_run = np.zeros(len(worked), dtype=np.int64)
+        streak = np.ones(len(worked), dtype=bool)
+        for dd in range(d - 1, -1, -1):
+            streak &= worked[:, dd]
+            prev_run += streak
+        next_run = np.zeros(len(worked), dtype=np.int64)
+        streak = np.ones(len(worked), dtype=bool)
+        for dd in range(d + 1, D):
+            streak &= worked[:, dd]
+            next_run += streak
+
+        total_run = prev_run + 1 + next_run
+        # max_consec is nan for employees without CONSECUTIVE_DAYS, so they never get the bonus
+        in_run = ((prev_run > 0) | (next_run > 0)) & (total_run <= max_consec)
+        return cost - 3000 * in_run  # bonus = -3000 for runs
 
     # rank open slots by most constrained -> least constrained
     # priority given to d1 and n shifts, then d2 on monday, wed, thurs only
-    def slot_order(self):
+    # (w, d, s) -> (priority, position) for every weekday slot, position keeps ties in generation order
+    def _slot_ranks(self):
         ORDER   = {0: 0, 2: 1, 1: 2}
         DAY_PRI = {
             weekdays.Thursday.value: 0,
             weekdays.Wednesday.value: 1,
             weekdays.Monday.value: 2
         }
-        slots = []
+        ranks = {}
         W, D, S = self.state.shape
         for w in range(W):
             for d in range(D):
@@ -170,70 +321,85 @@ class Solver:
                 for s in (0, 2, 1):
                     if d in (weekdays.Tuesday.value, weekdays.Friday.value) and s == 1:
                         continue
-                    hard_ok = 0
-                    soft_violations = {}
-                    for emp in self.allPool:
-                        if emp is self.unfilled or emp in self.state[w, d, :]:
-                            continue
-                        # no day-after-night
-                        if s in (0,1):
-                            prev = (d > 0 and self.state[w, d-1, 2] is emp) or \
-                                   (d == 0 and w > 0 and self.state[w-1, 6, 2] is emp)
-                            if prev:
-                                continue
-                        # absolute constraints
-                        orig = self.state[w, d, s]
-                        self.state[w, d, s] = emp
-                        abs_violate = any(
-                            not c.isSatisfied(self.state, w, d, s)
-                            for c in emp.getConstraints()
-                            if c.ctype == constraintType.ABSOLUTE
-                        )
-                        self.state[w, d, s] = orig
-                        if abs_violate:
-                            continue
-                        hard_ok += 1
-                        soft_violations[emp] = sum(
-                            not c.isSatisfied(self.state, w, d, s)
-                            for c in emp.getConstraints()
-                            if c.ctype == constraintType.RELATIVE
-                        )
-                    pr = ORDER[s]*10 + DAY_PRI.get(d, 3)
-                    slots.append(((w, d, s), hard_ok, pr, soft_violations))
-
-        slots.sort(key=lambda item: (
-            item[1],       # fewest hard_ok
-            item[2],       # priority
-            min(item[3].values()) if item[3] else float('inf')
-        ))
-
-        choiceList = [t[0] for t in slots]
-        return choiceList
+                    ranks[(w, d, s)] = (ORDER[s]*10 + DAY_PRI.get(d, 3), len(ranks))
+        return ranks
+
+    # sort key of an open slot: fewest employees feasible for it (the feasibility tensor), then priority,
+    # then the fewest relative violations among them (an open slot has no occupant to violate anything, so 0),
+    # then generation order
+    def _slot_key(self, w, d, s):
+        positions, _ = self.domain_batches[(d, s)]
+        self._refresh_feasible(self.state, w, d, s)
+        hard_ok = int(np.count_nonzero(self.feasible[w, d, s, positions]))
+        pr, position = self.slot_ranks[(w, d, s)]
+        return (hard_ok, pr, 0 if hard_ok else float('inf'), position)
+
+    def _refresh_slot(self, slot):
+        if self.state[slot] != UNFILLED_ID:
+            self._slot_live.pop(slot, None)
+            return
+        key = self._slot_key(*slot)
+        live = self._slot_live.get(slot)
+        if live is None or live[0] != key:
+            entry = (key, slot)
+            self._slot_live[slot] = entry
+            heapq.heappush(self._slot_heap, entry)
+
+    # bring the open-slot heap up to date with self.state
+    # only weekday slots in the affected weeks of the employees whose cells changed since the last sync (from the
+    # state's dirty-slot feed) are re-keyed; when self.state is a different object than last time it is rebuilt
+    def _sync_slot_queue(self):
+        dirty = self._catch_up(self._slot_watch, self.state)
+        if dirty is None:
+            self._slot_heap, self._slot_live = [], {}
+            for slot in self.slot_ranks:
+                self._refresh_slot(slot)
+        else:
+            weeks = set()
+            for affected in self._dirty_changes(dirty, self.state.grid).values():
+                weeks.update(affected)
+            if not weeks:
+                return
+            for w in weeks:
+                for slot in self.slots_in_week[w]:
+                    self._refresh_slot(slot)
+            # drop stale entries once they outnumber the live ones
+            if len(self._slot_heap) > 4 * len(self._slot_live) + 64:
+                self._slot_heap = list(self._slot_live.values())
+                heapq.heapify(self._slot_heap)
+
+    # open slots, most constrained first, lastRejected is tried last
+    # entries are popped lazily and pushed back when the caller stops iterating
+    def slot_order(self):
+        self._sync_slot_queue()
+        popped = []
+        try:
+            while self._slot_heap:
+                entry = heapq.heappop(self._slot_heap)
+                if self._slot_live.get(entry[1]) is not entry:
+                    continue
+                popped.append(entry)
+                if entry[1] != self.lastRejected:
+                    yield entry[1]
+            if self.lastRejected and self.state[self.lastRejected] == UNFILLED_ID:
+                yield self.lastRejected
+        finally:
+            for entry in popped:
+                heapq.heappush(self._slot_heap, entry)
 
     # propose the most appropriate move into most constrained slot
+    # returns the move as a list of (w, d, s, id) changes for self.state.apply, and the score after it
     def propose_move(self):
 
-        #list of available slots sorted by level of constraint
-        choices = self.slot_order()
-        if self.lastRejected:
-            choices = [c for c in choices if c != self.lastRejected] + [self.lastRejected]
-
-        #fill all the unfilled shifts until no more moves can be made
-        for (w, d, s) in choices:
-            if self.state[w, d, s] is not self.unfilled:
+        #fill all the unfilled shifts until no more moves can be made, most constrained slot first
+        for (w, d, s) in self.slot_order():
+            if self.state[w, d, s] != UNFILLED_ID:
                 continue
-            trial_state = self.state.copy()
-            trial_hours = self.hours_used.copy()
-            orig = trial_state[w, d, s]
-            if orig is not self.unfilled:
-                trial_hours[w][orig] -= SHIFTLENGTH
-
-            candidate = self._select_employee_for_slot(trial_state, w, d, s, trial_hours)
+            candidate = self._select_employee_for_slot(self.state, w, d, s)
             if candidate is not self.unfilled:
-                trial_state[w, d, s] = candidate
-                trial_hours[w][candidate] += SHIFTLENGTH
+                move = [(w, d, s, candidate.id)]
                 self.lastRejected = (w, d, s)
-                return trial_state, trial_hours
+                return move, self.current_score + self._score_counts(*self._seen_delta(move))
         
         W,D,S = self.state.shape
         #shuffle choices, find violations, try 2-way swap 
@@ -244,51 +410,129 @@ class Solver:
                     continue
                 for s in range(S):
                     emp = self.state[w,d,s]
-                    if emp is self.unfilled: continue
-                    for c in emp.getConstraints():
+                    if emp == UNFILLED_ID: continue
+                    for c in employeeById(emp).getConstraints():
                         if not c.isSatisfied(self.state, w, d, s):
                             violations.append((w,d,s))
                             break
         if len(violations) == 1:
             w,d,s = violations[0]
-            trial_state, trial_hours = self.state.copy(), self.hours_used.copy()
-            cand = self._select_employee_for_slot(trial_state, w, d, s, trial_hours)
+            cand = self._select_employee_for_slot(self.state, w, d, s)
             if cand is not self.unfilled:
-                trial_state[w,d,s] = cand
-                return trial_state, trial_hours
-        if len(violations) <= 0:
+                move = [(w, d, s, cand.id)]
+                return move, self.current_score + self._score_counts(*self._seen_delta(move))
+        if len(violations) < 2:
             return None, None
 
         for i in range(len(violations)):
             # pick two random distinct violating slots
-            (w1,d1,s1), (w2,d2,s2) = random.sample(violations, 2)
-            trial_state = self.state.copy()
-            trial_hours = self.hours_used.copy()
-            emp1, emp2 = trial_state[w1,d1,s1], trial_state[w2,d2,s2]
-            # swap them
-            trial_state[w1,d1,s1], trial_state[w2,d2,s2] = emp2, emp1
-            currGABS, _, currSABS, _, _ = self.balancer.numViolations(self.state)
-            trialGABS, _, trialSABS, _, _ = self.balancer.numViolations(trial_state)
-            if trialGABS > currGABS or trialSABS > currSABS:
+            (w1,d1,s1), (w2,d2,s2) = self.random.sample(violations, 2)
+            emp1, emp2 = self.state[w1,d1,s1], self.state[w2,d2,s2]
+            if not (self.in_domain(emp2, w1, d1, s1) and self.in_domain(emp1, w2, d2, s2)):
+                continue
+            swap = [(w1, d1, s1, emp2), (w2, d2, s2, emp1)]
+            counts = self._seen_delta(swap)
+            gabs, _, sabs, _, _ = counts
+            if gabs > 0 or sabs > 0:
                 continue
             else:
-                return trial_state, trial_hours
+                return swap, self.current_score + self._score_counts(*counts)
         return None, None
 
     # score constraint violations and unfilled shifts +1 for each relative violation and +50 for each unfilled shift, + ABS_PENALTY for absolute violations
     def score(self, schedule):
+        return self._score_counts(*self._counts(schedule))
+
+    # (global abs, global rel, staff abs, staff rel, holes) of schedule, from the transposition table when a
+    # ScheduleState with the same hash was counted before
+    # the lookup is a peek: only _seen_delta's lookups of schedules not yet reached count towards the hit rate
+    def _counts(self, schedule):
+        seen = isinstance(schedule, ScheduleState)
+        if seen:
+            counts = self.transpositions.peek(schedule.hash)
+            if counts is not None:
+                return counts
         g_abs, g_rel, s_abs, s_rel, _ = self.balancer.numViolations(schedule=schedule)
-        W, _, _ = schedule.shape
-        for w in range(W):
-            for d in range(7):
-                downstaff = d in (weekdays.Saturday.value, weekdays.Sunday.value,
-                                  weekdays.Tuesday.value, weekdays.Friday.value)
-                for s in range(3):
-                    if downstaff and s == 1:
-                        continue
-                    if schedule[w, d, s].name == "UNFILLED":
-                        g_abs += 50
-        return (g_abs + s_abs) * ABS_PENALTY + g_rel + s_rel
+        holes = np.count_nonzero(np.asarray(schedule)[self.required] == UNFILLED_ID)
+        counts = (int(g_abs), int(g_rel), int(s_abs), int(s_rel), int(holes))
+        if seen:
+            self.transpositions.put(schedule.hash, counts)
+        return counts
+
+    # _violation_delta of changes to self.state, looked up by the hash the state would have after them when that
+    # schedule was seen before; otherwise delta scored and remembered for next time
+    def _seen_delta(self, changes):
+        before = self._counts(self.state)
+        key = self.state.hashAfter(changes)
+        after = self.transpositions.get(key)
+        if after is not None:
+            return tuple(a - b for a, b in zip(after, before))
+        delta = self._violation_delta(self.state, changes)
+        self.transpositions.put(key, tuple(b + x for b, x in zip(before, delta)))
+        return delta
+
+    # score of every schedule in a (N, W, 7, 3) stack, equal to score() on each of them
+    def score_batch(self, schedules):
+        schedules = np.asarray(schedules)
+        g_abs, g_rel, s_abs, s_rel = self.balancer.batchViolations(schedules)
+        holes = np.count_nonzero(schedules[:, self.required] == UNFILLED_ID, axis=1)
+        return self._score_counts(g_abs, g_rel, s_abs, s_rel, holes)
+
+    def _score_counts(self, g_abs, g_rel, s_abs, s_rel, holes):
+        return (g_abs + 50 * holes + s_abs) * ABS_PENALTY + g_rel + s_rel
+
+    # weeks whose staff checks for an employee can change when they are added to or removed from (w, d)
+    # the neighbouring weeks cover NO_DAY_AFTER_NIGHT (which wraps around the template) and the MINIMUM_HOURS window,
+    # the pay period covers HOURS_PER_PAY_PERIOD, and a weekend change can flip WEEKEND_ROTATION in every week
+    def _affected_weeks(self, eid, w, d, W):
+        if d in (weekdays.Saturday.value, weekdays.Sunday.value) and \
+                employeeById(eid).hasConstraint(validStaffConstraint.WEEKEND_ROTATION):
+            return range(W)
+        pp_start = 2 * (w // 2)
+        return {(w - 1) % W, w, (w + 1) % W, pp_start, min(pp_start + 1, W - 1)}
+
+    # change in (global abs, global rel, staff abs, staff rel, holes) if changes were applied to schedule
+    # changes is a list of (w, d, s, employee id), only the constraint scopes of the changed slots are re-checked
+    # schedule is left as it was, and the trial assignments stay out of its move journal
+    def _violation_delta(self, schedule, changes):
+        W = schedule.shape[0]
+        scopes = {}
+        touches_holes = False
+        originals = []
+        for w, d, s, eid in changes:
+            old = schedule[w, d, s]
+            originals.append((w, d, s, old))
+            for e in (old, eid):
+                if e == UNFILLED_ID:
+                    touches_holes = True
+                else:
+                    scopes.setdefault(int(e), set()).update(self._affected_weeks(e, w, d, W))
+        scopes = {e: sorted(weeks) for e, weeks in scopes.items()}
+        slots = {(w, d, s) for w, d, s, _ in changes}
+
+        def measure():
+            g_abs = g_rel = s_abs = s_rel = 0
+            if touches_holes:
+                g_abs, g_rel = self.balancer.globalViolations(schedule)
+            for e, weeks in scopes.items():
+                a, r = self.balancer.employeeViolations(schedule, e, weeks)
+                s_abs += a
+                s_rel += r
+            holes = sum(1 for slot in slots if self.required[slot] and schedule[slot] == UNFILLED_ID)
+            return g_abs, g_rel, s_abs, s_rel, holes
+
+        before = measure()
+        with schedule.untracked():
+            for w, d, s, eid in changes:
+                schedule[w, d, s] = eid
+            after = measure()
+            for w, d, s, eid in reversed(originals):
+                schedule[w, d, s] = eid
+        return tuple(a - b for a, b in zip(after, before))
+
+    # exact score(after) - score(before) for applying changes to schedule, without a full rescore
+    def score_delta(self, schedule, changes):
+        return self._score_counts(*self._violation_delta(schedule, changes))
 
     # SA decision to accept proposal, always accept better scoring states, randomly accept worse states
     def acceptOffer(self,new_score):
@@ -310,17 +554,25 @@ class Solver:
     # searches for underworked employees and attempts to find slot to place them in
     # final sweep to check for violations
     # every step checks pre- and post- score, if worse, revert back to previous state before proceeding
-    def stateHandler(self):
-        def snapshot():
-            return (self.state.copy(),
-                    self.current_score,
-                    {w: h.copy() for w, h in self.hours_used.items()})
+    # construction picks how the greedy phase builds the first full schedule, see CONSTRUCTION
+    def stateHandler(self, construction=CONSTRUCTION):
+        constructions = {'anneal': self.greedySearch, 'regret': self.regretConstruction,
+                         'tempering': self.temperingSearch, 'tabu': self.tabuSearch,
+                         'lns': self.lnsSearch, 'exact': self.exactSearch,
+                         'flow': self.flowConstruction,
+                         'none': lambda: (self.state.copy(), self.current_score, [], [])}
+        if construction not in constructions:
+            raise ValueError(f"unknown construction {construction!r}, expected one of {sorted(constructions)}")
+
+        # phases work on self.state in place, so a snapshot is a savepoint in its move journal
+        def snapshot(name):
+            self.state.savepoint(name)
+            return name, self.current_score
 
         def restore(snap):
-            st, sc, hrs = snap
-            self.state = st.copy()
+            name, sc = snap
+            self.state.undo(name)
             self.current_score = sc
-            self.hours_used = {w: h.copy() for w, h in hrs.items()}
             self.balancer.state = self.state
 
         history_epochs, history_scores = [], []
@@ -328,17 +580,17 @@ class Solver:
         # Greedy phase
         print(self.balancer)
         print(f"Starting Score: {self.current_score}")
-        print("Starting greedy initialization…")
-        greedy_snap = snapshot()
-        greedy_state, greedy_score, history_epochs, history_scores = self.greedySearch()
+        print(f"Starting greedy initialization ({construction})…")
+        greedy_state, greedy_score, history_epochs, history_scores = constructions[construction]()
         # after greedySearch, self.state/self.current_score are updated
+        self.state.begin()
+        greedy_snap = snapshot('greedy')
         print("-----------------Greedy Phase Complete--------------")
         print(f"Greedy best state\n{self.balancer}")
         print(f"Score: {self.current_score}")
 
         # Repair phase
         print("Starting post-Greedy repair…")
-        repair_snap = snapshot()
         self.state, history_epochs, history_scores, _ = self.repair_schedule(history_epochs, history_scores)
         self.current_score = self.score(self.state)
         print(f"After Repair state\n{self.balancer}")
@@ -347,23 +599,20 @@ class Solver:
         if self.current_score > greedy_score:
             print("Repair worsened relative cost—rolling back to greedy solution")
             restore(greedy_snap)
-        repair_snap = snapshot()   # re-snapshot after possible rollback
         print("-----------------Repair Phase Complete--------------")
 
         # Final-fill phase
         print("Filling Minimums…")
-        fill_snap = snapshot()
         self.state, history_epochs, history_scores = self.finalFillMinimums(history_epochs, history_scores)
         self.current_score = self.score(self.state)
         print(f"After Filling state\n{self.balancer}")
         print(f"Score: {self.current_score}")
         # Fill doesn't roll back
-        fill_snap = snapshot()
+        fill_snap = snapshot('fill')
         print("-----------------Fill Phase Complete--------------")
 
         # Final sweep
         print("Final Sweep…")
-        sweep_snap = snapshot()
         self.state, history_epochs, history_scores = self.finalPass(history_epochs, history_scores)
         self.current_score = self.score(self.state)
         print(f"After Sweep state\n{self.balancer}")
@@ -373,16 +622,20 @@ class Solver:
             print("Sweep worsened relative cost—rolling back to fill solution")
             restore(fill_snap)
 
+        self.state.end()
+
         print("-----------------Template Complete--------------")
+        print(f"Transposition table: {self.transpositions}")
         print(f"Final Score: {self.current_score}")
-        return self.state, self.current_score, history_epochs, history_scores
+        return self.state.grid, self.current_score, history_epochs, history_scores
 
 
     # greedy search with simulated annealing
+    # moves are applied in place under the state's move journal, committed at every new best, so going back to the
+    # best state is an undo of the moves since
     def greedySearch(self):     
-        best_state = self.state.copy()
+        self.state.begin()
         best_score = self.current_score
-        best_hours = self.hours_used.copy()
         history_epochs, history_scores = [], []
         epoch = patience = acceptCounter = 0
 
@@ -390,7 +643,8 @@ class Solver:
             # restart to best state if no change has been made for a while - defined by patience
             if patience > PATIENCE:
                 print("Impatient Restart")
-                self.state, self.current_score, self.hours_used = best_state, best_score, best_hours
+                self.state.undo()
+                self.current_score = best_score
                 self.lastRejected = None
                 self.temperature = TEMPERATURE
             epoch += 1
@@ -398,14 +652,14 @@ class Solver:
                 print(f"Epoch {epoch}, current score: {self.current_score}, best score: {best_score}, heat: {self.temperature:.2f}")
 
             # propose move into slot and decide whether to accept
-            new_state, h_map = self.propose_move()
-            if new_state is None:
+            move, new_score = self.propose_move()
+            if move is None:
                 break
-            new_score = self.score(new_state)
             prob = self.acceptOffer(new_score)
 
-            if random.random() < prob:
-                self.state, self.hours_used, self.current_score = new_state, h_map, new_score
+            if self.random.random() < prob:
+                self.state.apply(move)
+                self.current_score = new_score
                 self.lastRejected = None
                 acceptCounter += 1
                 patience = 0
@@ -413,19 +667,625 @@ class Solver:
                 patience += 1
  
             if self.current_score < best_score:
-                best_state, best_score = self.state.copy(), self.current_score
-                best_hours = self.hours_used
+                self.state.commit()
+                best_score = self.current_score
             
             acceptRate = acceptCounter/epoch
             self.cool(acceptRate)
 
             history_epochs.append(epoch)
             history_scores.append(self.current_score)        
-        self.state, self.current_score, self.hours_used = best_state, best_score, best_hours
+        self.state.undo()
+        self.state.end()
+        self.current_score = best_score
         self.balancer.state = self.state
         greedy_state, greedy_score = self.state.copy(), self.current_score     
         return greedy_state, greedy_score, history_epochs, history_scores
 
+    # parallel tempering: REPLICAS chains held at a fixed geometric ladder of temperatures from TEMPERATURE down to
+    # COLDEST, each taking propose_move/acceptOffer steps in turn, one step per replica per epoch
+    # every EXCHANGE_EVERY epochs neighbouring rungs (even pairs, then odd pairs the next round) trade replicas
+    # with probability min(1, exp((1/T_cold - 1/T_hot) * (E_cold - E_hot))), so good states drift down to the cold end
+    # the replicas are separate Solvers with their own state, caches and random stream, self is the coldest to start
+    # stops at EPOCH_LIMIT, once no replica can move or after PATIENCE epochs without a new best (in place of
+    # greedySearch's restarts), and leaves the best state seen in self.state
+    # every replica journals its moves; the one holding the best keeps them since that best, the others commit each
+    # step, so the best state is recovered by undoing its owner's journal
+    def temperingSearch(self):
+        W = max(REPLICAS, 1)
+        ladder = TEMPERATURE * (COLDEST / TEMPERATURE) ** (np.arange(W) / max(W - 1, 1))  # hottest first
+        rungs = [self._replica() for _ in range(W - 1)] + [self]
+        for replica, temperature in zip(rungs, ladder):
+            replica.temperature = temperature
+            replica.state.begin()
+        best_owner, best_score = self, self.current_score
+        history_epochs, history_scores = [], []
+        epoch = exchanges = patience = 0
+
+        while epoch < EPOCH_LIMIT and patience <= PATIENCE:
+            epoch += 1
+            patience += 1
+            moved = False
+            for replica in rungs:
+                move, new_score = replica.propose_move()
+                if move is None:
+                    continue
+                moved = True
+                if replica.random.random() < replica.acceptOffer(new_score):
+                    replica.state.apply(move)
+                    replica.current_score = new_score
+                    replica.lastRejected = None
+                improved = replica.current_score < best_score
+                if improved:
+                    best_owner, best_score = replica, replica.current_score
+                    patience = 0
+                if improved or replica is not best_owner:
+                    replica.state.commit()
+            if not moved:
+                break
+
+            if epoch % EXCHANGE_EVERY == 0:
+                for k in range((epoch // EXCHANGE_EVERY) % 2, W - 1, 2):
+                    hot, cold = rungs[k], rungs[k + 1]
+                    gain = (1 / cold.temperature - 1 / hot.temperature) * (cold.current_score - hot.current_score)
+                    if gain >= 0 or self.random.random() < math.exp(gain):
+                        hot.temperature, cold.temperature = cold.temperature, hot.temperature
+                        rungs[k], rungs[k + 1] = cold, hot
+                        exchanges += 1
+            if epoch % 100 == 0:
+                print(f"Epoch {epoch}, rung scores: {[r.current_score for r in rungs]}, best score: {best_score}")
+
+            history_epochs.append(epoch)
+            history_scores.append(min(r.current_score for r in rungs))
+
+        print(f"Tempering ran {epoch} epochs over {W} replicas, {exchanges} exchanges")
+        best_owner.state.undo()
+        for replica in rungs:
+            replica.state.end()
+        self.state = best_owner.state if best_owner is self else best_owner.state.copy()
+        self.current_score = best_score
+        self.lastRejected = None
+        self.temperature = TEMPERATURE
+        self.balancer.state = self.state
+        return self.state.copy(), self.current_score, history_epochs, history_scores
+
+    # an independent chain starting from a copy of self.state, sharing the balancer and roster
+    def _replica(self):
+        replica = Solver(self.balancer, self.dayPool, self.nightPool, self.floatPool, self.unfilled,
+                         seed=self.random.randrange(2**32))
+        replica.state = self.state.copy()
+        replica.current_score = self.current_score
+        return replica
+
+    # tabu search over the weekday slots the construction fills: reassign moves put any domain employee into any slot,
+    # open or filled, and swap moves trade two filled slots whose weeks are far enough apart that neither employee's
+    # two changes can meet in a check
+    # each iteration takes the best admissible move even when it is worse; an employee may not go back to a slot they
+    # left in the last TABU_TENURE iterations unless that gives a new best (aspiration)
+    # moves are scored from per-slot caches, so after a move only the slots whose checks it could reach are re-evaluated
+    # stops at EPOCH_LIMIT iterations, when no move is admissible or after TABU_PATIENCE iterations without a new best,
+    # and leaves the best state seen in self.state; moves go through the move journal, committed at every new best
+    def tabuSearch(self):
+        state = self.state
+        W = state.shape[0]
+        slots = list(self.slot_ranks)
+        weeks_of = [set(self._affected_weeks(UNFILLED_ID, w, 0, W)) for w in range(W)]  # weekday scopes
+        far = np.array([[not (weeks_of[a] & weeks_of[b]) for b in range(W)] for a in range(W)])
+        place = {}   # slot -> score change of putting each employee of its domain there, inf where not allowed
+        remove = {}  # filled slot -> staff score change of taking its occupant out
+        fill = {}    # open slot -> holes and global score change of filling it
+        tabu = {}    # slot -> {employee id: last iteration they may not return}
+
+        def refresh_place(slot):
+            positions, batch = self.domain_batches[slot[1:]]
+            _, abs_delta, rel_delta, _ = batch.evaluate(state, *slot)
+            delta = (abs_delta * ABS_PENALTY + rel_delta).astype(float)
+            delta[state.dayCount[batch.ids, slot[0], slot[1]] > 0] = np.inf
+            place[slot] = delta
+
+        def refresh_remove(slot):
+            eid = int(state[slot])
+            weeks = sorted(self._affected_weeks(eid, slot[0], slot[1], W))
+            before_abs, before_rel = self.balancer.employeeViolations(state, eid, weeks)
+            with state.untracked():
+                state[slot] = UNFILLED_ID
+                after_abs, after_rel = self.balancer.employeeViolations(state, eid, weeks)
+                state[slot] = eid
+            remove[slot] = self._score_counts(0, 0, after_abs - before_abs, after_rel - before_rel, 0)
+
+        def refresh_fill():
+            fill.clear()
+            g_abs, g_rel = self.balancer.globalViolations(state)
+            placeholder = self.candidates.ids[0]
+            for slot in slots:
+                if state[slot] == UNFILLED_ID:
+                    with state.untracked():
+                        state[slot] = placeholder
+                        after_abs, after_rel = self.balancer.globalViolations(state)
+                        state[slot] = UNFILLED_ID
+                    fill[slot] = self._score_counts(after_abs - g_abs, after_rel - g_rel, 0, 0, -int(self.required[slot]))
+
+        def admissible(slot, eid, total):
+            return tabu.get(slot, {}).get(eid, -1) < epoch or self.current_score + total < best_score
+
+        def best_reassign():
+            best = (np.inf, None)
+            for slot in slots:
+                base = fill[slot] if state[slot] == UNFILLED_ID else remove[slot]
+                total = place[slot] + base
+                ids = self.domain_batches[slot[1:]][1].ids
+                for k in np.argsort(total, kind='stable'):
+                    if total[k] >= best[0]:
+                        break
+                    if admissible(slot, ids[k], total[k]):
+                        best = (total[k], [(slot, int(ids[k]))])
+                        break
+            return best
+
+        def best_swap():
+            filled = [slot for slot in slots if state[slot] != UNFILLED_ID]
+            if len(filled) < 2:
+                return np.inf, None
+            occupants = np.array([self.position_of[state[slot]] for slot in filled])
+            weeks = np.array([slot[0] for slot in filled])
+            # cost[i, j]: score change of putting the occupant of filled[j] into filled[i]
+            into = np.full((len(filled), len(self.candidates.ids)), np.inf)
+            for i, slot in enumerate(filled):
+                into[i, self.domain_batches[slot[1:]][0]] = place[slot]
+            cost = into[:, occupants]
+            removal = np.array([remove[slot] for slot in filled])
+            total = removal[:, None] + removal[None, :] + cost + cost.T
+            total[~far[weeks[:, None], weeks[None, :]]] = np.inf
+            total[occupants[:, None] == occupants[None, :]] = np.inf
+            total[np.tril_indices(len(filled))] = np.inf
+            for flat in np.argsort(total, axis=None, kind='stable'):
+                i, j = divmod(int(flat), len(filled))
+                if not np.isfinite(total[i, j]):
+                    break
+                a, b = filled[i], filled[j]
+                e1, e2 = int(state[a]), int(state[b])
+                if admissible(a, e2, total[i, j]) and admissible(b, e1, total[i, j]):
+                    return total[i, j], [(a, e2), (b, e1)]
+            return np.inf, None
+
+        for slot in slots:
+            refresh_place(slot)
+            if state[slot] != UNFILLED_ID:
+                refresh_remove(slot)
+        refresh_fill()
+
+        state.begin()
+        best_score = self.current_score
+        history_epochs, history_scores = [], []
+        epoch = patience = 0
+        while epoch < EPOCH_LIMIT and patience < TABU_PATIENCE:
+            epoch += 1
+            patience += 1
+            delta, move = min(best_reassign(), best_swap(), key=lambda m: m[0])
+            if move is None:
+                break
+
+            stale_weeks, stale_remove, holes_changed = set(), set(), False
+            for slot, eid in move:
+                old = int(state[slot])
+                state[slot] = eid
+                if old == UNFILLED_ID:
+                    holes_changed = True
+                else:
+                    tabu.setdefault(slot, {})[old] = epoch + TABU_TENURE
+                stale_remove.add(slot)
+                for e in (old, eid):
+                    if e == UNFILLED_ID:
+                        continue
+                    reach = set(self._affected_weeks(e, slot[0], slot[1], W))
+                    stale_weeks.update(k for k in range(W) if weeks_of[k] & reach)
+                    stale_remove.update(other for other in state.slotsOf(e)
+                                        if other in self.slot_ranks and weeks_of[other[0]] & reach)
+            self.current_score += int(delta)
+            for k in stale_weeks:
+                for slot in self.slots_in_week[k]:
+                    refresh_place(slot)
+            for slot in stale_remove:
+                refresh_remove(slot)
+            if holes_changed:
+                refresh_fill()
+
+            if self.current_score < best_score:
+                state.commit()
+                best_score = self.current_score
+                patience = 0
+            if epoch % 100 == 0:
+                print(f"Tabu iteration {epoch}, current score: {self.current_score}, best score: {best_score}")
+            history_epochs.append(epoch)
+            history_scores.append(self.current_score)
+
+        print(f"Tabu search ran {epoch} iterations, best score {best_score}")
+        state.undo()
+        state.end()
+        self.current_score = best_score
+        self.lastRejected = None
+        self.balancer.state = self.state
+        return self.state.copy(), self.current_score, history_epochs, history_scores
+
+    # exact depth-first branch and bound over the weekday slots the construction fills, starting with them all open
+    # each slot keeps a domain of candidate positions, narrowed on every assignment by propagating ONE_PER_DAY,
+    # NO_DAY_AFTER_NIGHT (both ways), absolute weekly day/night shift caps and absolute pay-period hours
+    # the open slot with the smallest domain is branched on first: its employees by score change, then leaving it open
+    # absolute rules are hard here as in the constructions, an employee whose placement fails one is never tried
+    # the bound is the forced holes (slots left open or with an empty domain) plus the staff violations so far of every
+    # rule but MINIMUM_HOURS and MIN_REST, which are the only ones adding a shift can clear; the other score terms are
+    # >= 0, and subtrees whose bound reaches the best score found are cut
+    # so the search is exact only over hard-feasible assignments: score charges a hole far more than an absolute
+    # violation, and a schedule that breaks a rule instead of leaving a slot open can score below both the result and
+    # its bound; a finished search is reported as optimal within hard-feasible assignments, otherwise the best
+    # schedule found (the input if nothing beats it) is kept and the gap to the root bound is reported
+    def exactSearch(self):
+        state = self.state
+        W, D, _ = state.shape
+        ids = self.candidates.ids
+        variables = list(self.slot_ranks)
+        order = np.array([self.slot_ranks[slot] for slot in variables])
+        required = np.array([bool(self.required[slot]) for slot in variables])
+        hard = {}
+        for key in (validStaffConstraint.DAYSHIFTS_PER_WEEK, validStaffConstraint.NIGHTSHIFTS_PER_WEEK,
+                    validStaffConstraint.HOURS_PER_PAY_PERIOD):
+            constraints = [emp.constraint(key) for emp in self.candidates.employees]
+            hard[key] = np.array([c.val if c is not None and c.ctype == constraintType.ABSOLUTE else np.inf
+                                  for c in constraints], dtype=float)
+        rested = [emp.constraint(validStaffConstraint.NO_DAY_AFTER_NIGHT) for emp in self.candidates.employees]
+        rested = [c is not None and c.ctype == constraintType.ABSOLUTE for c in rested]
+
+        # slots sharing a day, a (shift kind, day) pair, a (shift kind, week) pair or a pay period
+        groups = {}
+        for i, (w, d, s) in enumerate(variables):
+            for key in (('day', w, d), ('shift', s == 2, w * D + d), ('week', s == 2, w), ('period', w // 2)):
+                groups.setdefault(key, []).append(i)
+        groups = {key: np.array(members) for key, members in groups.items()}
+        no_slots = np.zeros(0, dtype=np.intp)
+        domain = np.zeros((len(variables), len(ids)), dtype=bool)
+        for i, (w, d, s) in enumerate(variables):
+            domain[i, self.domain_batches[(d, s)][0]] = True
+        is_open = np.ones(len(variables), dtype=bool)
+        trail = []
+
+        def strike(key, pos):
+            members = groups.get(key, no_slots)
+            hit = members[domain[members, pos]]
+            domain[hit, pos] = False
+            trail.append((hit, pos))
+
+        # remove what placing candidate pos at (w, d, s) rules out for them elsewhere
+        def propagate(pos, w, d, s):
+            eid = int(ids[pos])
+            t = w * D + d
+            strike(('day', w, d), pos)
+            for offset in (1, 2) if rested[pos] else ():
+                if s == 2:
+                    strike(('shift', False, (t + offset) % (W * D)), pos)
+                else:
+                    strike(('shift', True, (t - offset) % (W * D)), pos)
+            if s < 2 and state.dayShifts(eid, w) >= hard[validStaffConstraint.DAYSHIFTS_PER_WEEK][pos]:
+                strike(('week', False, w), pos)
+            if s == 2 and state.nightShifts(eid, w) >= hard[validStaffConstraint.NIGHTSHIFTS_PER_WEEK][pos]:
+                strike(('week', True, w), pos)
+            if state.payPeriodHours(eid, w) + SHIFTLENGTH > hard[validStaffConstraint.HOURS_PER_PAY_PERIOD][pos]:
+                strike(('period', w // 2), pos)
+
+        best_state, best_score = state.copy(), self.current_score
+        for slot in variables:
+            state[slot] = UNFILLED_ID
+        for w, d, s in zip(*np.nonzero(state.grid != UNFILLED_ID)):
+            pos = self.position_of[state[w, d, s]]
+            if pos >= 0:
+                propagate(pos, w, d, s)
+        trail.clear()
+        self.current_score = self.score(state)
+        fixed_holes = sum(1 for slot in zip(*np.nonzero(self.required)) if slot not in self.slot_ranks and state[slot] == UNFILLED_ID)
+        left_open = 0
+
+        # score of one employee's violations within weeks, of the rules that adding shifts can only break further
+        def settled(eid, weeks):
+            rules = [c for c in employeeById(eid).getConstraints()
+                     if c.key not in (validStaffConstraint.MINIMUM_HOURS, validStaffConstraint.MIN_REST)]
+            absV = relV = 0
+            for w, d, s in state.slotsOf(eid):
+                if w in weeks:
+                    for c in rules:
+                        if not c.isSatisfied(state, w, d, s):
+                            absV += c.ctype == constraintType.ABSOLUTE
+                            relV += c.ctype != constraintType.ABSOLUTE
+            return self._score_counts(0, 0, absV, relV, 0)
+
+        committed = sum(settled(int(eid), set(range(W))) for eid in ids)
+
+        def bound():
+            forced = left_open + np.count_nonzero(is_open & required & ~domain.any(axis=1))
+            return committed + self._score_counts(0, 0, 0, 0, fixed_holes + forced)
+
+        root_bound = bound()
+        history_epochs, history_scores = [], []
+        nodes = 0
+        timed_out = False
+        deadline = time.time() + BNB_TIME_LIMIT
+
+        def search():
+            nonlocal nodes, timed_out, best_state, best_score, left_open, committed
+            nodes += 1
+            if time.time() > deadline:
+                timed_out = True
+                return
+            if bound() >= best_score:
+                return
+            remaining = np.flatnonzero(is_open)
+            if not len(remaining):
+                if self.current_score < best_score:
+                    best_state, best_score = state.copy(), self.current_score
+                    history_epochs.append(nodes)
+                    history_scores.append(best_score)
+                return
+            sizes = domain[remaining].sum(axis=1)
+            i = remaining[np.lexsort((order[remaining, 1], order[remaining, 0], sizes))[0]]
+            w, d, s = slot = variables[i]
+            positions, batch = self.domain_batches[(d, s)]
+            hard_fail, abs_delta, rel_delta, _ = batch.evaluate(state, w, d, s)
+            allowed = np.flatnonzero(domain[i, positions] & ~hard_fail)
+            cost = abs_delta[allowed] * ABS_PENALTY + rel_delta[allowed]
+            values = [int(positions[k]) for k in allowed[np.argsort(cost, kind='stable')]] + [None]
+
+            is_open[i] = False
+            for pos in values:
+                if timed_out:
+                    break
+                mark, score, settled_before = len(trail), self.current_score, committed
+                if pos is None:
+                    left_open += 1
+                    search()
+                    left_open -= 1
+                    continue
+                eid = int(ids[pos])
+                weeks = set(self._affected_weeks(eid, w, d, W))
+                self.current_score += self.score_delta(state, [(w, d, s, eid)])
+                committed -= settled(eid, weeks)
+                state[slot] = eid
+                committed += settled(eid, weeks)
+                propagate(pos, w, d, s)
+                search()
+                state[slot] = UNFILLED_ID
+                while len(trail) > mark:
+                    hit, p = trail.pop()
+                    domain[hit, p] = True
+                self.current_score, committed = score, settled_before
+            is_open[i] = True
+
+        search()
+        lower = min(root_bound, best_score) if timed_out else best_score
+        gap = best_score - lower
+        outcome = 'stopped at the time limit' if timed_out else 'is optimal within hard-feasible assignments'
+        print(f"Exact search {outcome} after {nodes} nodes: best score {best_score}, "
+              f"hard-feasible lower bound {lower}, gap {gap} ({100 * gap / max(best_score, 1):.1f}%)")
+        if np.count_nonzero(np.asarray(best_state)[self.required] == UNFILLED_ID):
+            print("  holes remain, filling them in breach of an absolute rule may still score lower")
+        self.state, self.current_score = best_state, best_score
+        self.lastRejected = None
+        self.balancer.state = self.state
+        return self.state.copy(), self.current_score, history_epochs, history_scores
+
+    # one min-cost flow per pay period over its open weekday slots:
+    # source -> employee, one unit per shift left under their pay-period hours cap, the units that would bring them
+    # up to MINIMUM_HOURS earning one violation's score back -> employee's day, one unit (ONE_PER_DAY) -> slot, at the
+    # employee's score change there -> sink, earning a hole's penalty back
+    # costs and eligibility are read off the schedule as it stands before the period is filled, so rules coupling two
+    # shifts of the period (weekly caps, NO_DAY_AFTER_NIGHT across days, rest) are only checked as the flow is applied:
+    # assignments can_place rejects are dropped and the slots still open afterwards go to _greedy_fill
+    def flowConstruction(self):
+        state = self.state
+        W = state.shape[0]
+        ids = self.candidates.ids
+        minimum = self.candidates.limits(validStaffConstraint.MINIMUM_HOURS)
+        rewards = []
+        for emp in self.candidates.employees:
+            c = emp.constraint(validStaffConstraint.MINIMUM_HOURS)
+            absolute = c is not None and c.ctype == constraintType.ABSOLUTE
+            rewards.append(self._score_counts(0, 0, int(absolute), int(not absolute), 0))
+        history_epochs, history_scores = [], []
+        dropped = 0
+
+        for start in range(0, W, 2):
+            slots = [slot for w in range(start, min(start + 2, W)) for slot in self.slots_in_week[w]
+                     if state[slot] == UNFILLED_ID]
+            if not slots:
+                continue
+            net = FlowNetwork()
+            used = state.payPeriodHours(ids, start)
+            room = np.floor((self.hour_caps - used) / SHIFTLENGTH)
+            short = np.ceil((minimum - used) / SHIFTLENGTH)
+            for pos in range(len(ids)):
+                capacity = len(slots) if np.isnan(room[pos]) else int(max(room[pos], 0))
+                need = 0 if np.isnan(short[pos]) else int(min(max(short[pos], 0), capacity))
+                if need:
+                    net.addEdge('source', ('employee', pos), need, -rewards[pos])
+                if capacity > need:
+                    net.addEdge('source', ('employee', pos), capacity - need, 0)
+
+            days, arcs = set(), {}
+            for slot in slots:
+                w, d, s = slot
+                positions, batch = self.domain_batches[(d, s)]
+                evaluated = self._refresh_feasible(state, w, d, s)
+                eligible = self.feasible[w, d, s, positions]
+                if not eligible.any():
+                    continue
+                if evaluated is None:
+                    evaluated = batch.evaluate(state, w, d, s)
+                _, abs_delta, rel_delta, _ = evaluated
+                cost = abs_delta * ABS_PENALTY + rel_delta
+                for k in np.flatnonzero(eligible):
+                    pos = int(positions[k])
+                    if (pos, w, d) not in days:
+                        days.add((pos, w, d))
+                        net.addEdge(('employee', pos), ('day', pos, w, d), 1, 0)
+                    arcs[net.addEdge(('day', pos, w, d), slot, 1, int(cost[k]))] = (slot, int(batch.ids[k]))
+                net.addEdge(slot, 'sink', 1, -self._score_counts(0, 0, 0, 0, int(self.required[slot])))
+            net.minCostFlow('source', 'sink')
+
+            for edge, (slot, eid) in arcs.items():
+                if not net.flow(edge):
+                    continue
+                if not self.can_place(state, eid, *slot):
+                    dropped += 1
+                    continue
+                self.current_score += self.score_delta(state, [(*slot, eid)])
+                state[slot] = eid
+                history_epochs.append(len(history_epochs) + 1)
+                history_scores.append(self.current_score)
+
+        print(f"Flow construction filled {len(history_epochs)} slots ({dropped} dropped), score {self.current_score}")
+        self._greedy_fill(self.slot_ranks)
+        history_epochs.append(len(history_epochs) + 1)
+        history_scores.append(self.current_score)
+        self.balancer.state = self.state
+        return self.state.copy(), self.current_score, history_epochs, history_scores
+
+    # one-pass construction by regret: repeatedly fill the open slot whose best candidate is furthest ahead of
+    # its second best (a slot with one candidate has infinite regret), ties by slot priority
+    # stops once no open slot has a candidate, only slots in the affected weeks of the employee just placed are re-ranked
+    def regretConstruction(self):
+        history_scores = self._regret_fill(self.slot_ranks)
+        history_epochs = list(range(1, len(history_scores) + 1))
+        self.balancer.state = self.state
+        print(f"Regret construction filled {len(history_epochs)} slots, score {self.current_score}")
+        return self.state.copy(), self.current_score, history_epochs, history_scores
+
+    # fill the open slots among slots by regret, returns the score after each fill
+    def _regret_fill(self, slots):
+        history_scores = []
+        W = self.state.shape[0]
+        heap, live = [], {}
+
+        def rank(slot):
+            live.pop(slot, None)
+            if slot not in slots or self.state[slot] != UNFILLED_ID:
+                return
+            ranked, costs = self._ranked_candidates(self.state, *slot)
+            if not len(ranked):
+                return
+            regret = float(costs[1] - costs[0]) if len(ranked) > 1 else float('inf')
+            entry = (-regret, *self.slot_ranks[slot], slot, int(self.candidates.ids[ranked[0]]))
+            live[slot] = entry
+            heapq.heappush(heap, entry)
+
+        for slot in slots:
+            rank(slot)
+
+        while heap:
+            entry = heapq.heappop(heap)
+            slot, eid = entry[-2:]
+            if live.get(slot) is not entry:
+                continue
+            del live[slot]
+            w, d, s = slot
+            self.current_score += self.score_delta(self.state, [(w, d, s, eid)])
+            self.state[w, d, s] = eid
+            history_scores.append(self.current_score)
+            for week in self._affected_weeks(eid, w, d, W):
+                for other in self.slots_in_week.get(week, ()):
+                    rank(other)
+        return history_scores
+
+    # fill the open slots among slots one at a time, most constrained first, with _select_employee_for_slot
+    def _greedy_fill(self, slots):
+        for slot in sorted(slots, key=lambda slot: self._slot_key(*slot)):
+            if self.state[slot] != UNFILLED_ID:
+                continue
+            emp = self._select_employee_for_slot(self.state, *slot)
+            if emp is not self.unfilled:
+                self.current_score += self.score_delta(self.state, [(*slot, emp.id)])
+                self.state[slot] = emp.id
+
+    # large-neighbourhood search: each iteration empties a block of weekday slots chosen by one of the destroy
+    # operators below, rebuilds it with _regret_fill or _greedy_fill (picked at random) and keeps the result by the
+    # annealing criterion, so whole weeks and pay periods can be rearranged where single-slot moves get stuck
+    # runs for LNS_TIME_BUDGET seconds, leaves the best state seen in self.state and prints how much each destroy
+    # operator improved the score per second spent in it
+    # self.state is changed in place under its move journal: a rejected rebuild is undone back to the iteration's
+    # savepoint and every new best is committed, so the best state is an undo of the iterations since
+    def lnsSearch(self):
+        W = self.state.shape[0]
+
+        def pay_period():
+            start = 2 * (self.random.randrange(W) // 2)
+            return [slot for w in range(start, min(start + 2, W)) for slot in self.slots_in_week[w]]
+
+        def week():
+            return list(self.slots_in_week[self.random.randrange(W)])
+
+        def employee():
+            working = sorted({int(self.state[slot]) for slot in self.slot_ranks} - {UNFILLED_ID})
+            if not working:
+                return []
+            return sorted(slot for slot in self.state.slotsOf(self.random.choice(working)) if slot in self.slot_ranks)
+
+        def nights():
+            return [slot for slot in pay_period() if slot[2] == 2]
+
+        operators = {'week': week, 'pay period': pay_period, 'employee': employee, 'nights': nights}
+        stats = {name: [0, 0, 0, 0.0] for name in operators}  # runs, accepted, improvement, seconds
+        self.state.begin()
+        best_score = self.current_score
+        history_epochs, history_scores = [], []
+        epoch = acceptCounter = 0
+        start = time.time()
+
+        while time.time() - start < LNS_TIME_BUDGET:
+            epoch += 1
+            name = self.random.choice(list(operators))
+            began = time.time()
+            block = set(operators[name]())
+            self.state.savepoint('iteration')
+            before_score = self.current_score
+            changes = [(*slot, UNFILLED_ID) for slot in sorted(block) if self.state[slot] != UNFILLED_ID]
+            if changes:
+                self.current_score += self.score_delta(self.state, changes)
+                for w, d, s, _ in changes:
+                    self.state[w, d, s] = UNFILLED_ID
+            if self.random.random() < 0.5:
+                self._regret_fill(block)
+            else:
+                self._greedy_fill(block)
+
+            new_score, self.current_score = self.current_score, before_score
+            if self.random.random() < self.acceptOffer(new_score):
+                self.current_score = new_score
+                self.lastRejected = None
+                acceptCounter += 1
+                stats[name][1] += 1
+                stats[name][2] += max(0, before_score - new_score)
+            else:
+                self.state.undo('iteration')
+            stats[name][0] += 1
+            stats[name][3] += time.time() - began
+
+            if self.current_score < best_score:
+                self.state.commit()
+                best_score = self.current_score
+            self.cool(acceptCounter / epoch)
+            if epoch % 100 == 0:
+                print(f"LNS iteration {epoch}, current score: {self.current_score}, best score: {best_score}")
+            history_epochs.append(epoch)
+            history_scores.append(self.current_score)
+
+        print(f"LNS ran {epoch} iterations, best score {best_score}")
+        for name, (runs, accepted, improvement, seconds) in sorted(stats.items(), key=lambda item: -item[1][2] / max(item[1][3], 1e-9)):
+            print(f"  {name}: {runs} runs, {accepted} accepted, improved {improvement} "
+                  f"({improvement / max(seconds, 1e-9):.0f}/s over {seconds:.1f}s)")
+        self.state.undo()
+        self.state.end()
+        self.current_score = best_score
+        self.lastRejected = None
+        self.temperature = TEMPERATURE
+        self.balancer.state = self.state
+        return self.state.copy(), self.current_score, history_epochs, history_scores
+
     def find_violations(self):
             vio = []
             W, D, S = self.state.shape
@@ -434,12 +1294,12 @@ class Solver:
                     if d in (weekdays.Saturday.value, weekdays.Sunday.value):
                         continue
                     for s in range(S):
-                        emp = self.state[w, d, s]
+                        emp = employeeById(self.state[w, d, s])
                         if emp is self.unfilled:
                             continue
                         for c in emp.getConstraints():
                             if not c.isSatisfied(self.state, w, d, s):
-                                if c.name == validStaffConstraint.MINIMUM_HOURS.value:
+                                if c.key is validStaffConstraint.MINIMUM_HOURS:
                                     continue
                                 vio.append((emp, c, w, d, s))
 
@@ -447,286 +1307,364 @@ class Solver:
             for w in range(W):
                 for d in range(D):
                     for s in range(S):
-                        if self.state[w, d, s] is self.unfilled:
+                        if self.state[w, d, s] == UNFILLED_ID:
                             for gc in self.balancer.constraints:
                                 if gc.ctype == constraintType.ABSOLUTE and not gc.isSatisfied(self.state, w, d, s):
                                     vio.append((self.unfilled, gc, w, d, s))
                                     break
             return vio
     
+    # True if find_violations would list weekday slot (w, d, s): a filled slot breaking one of its employee's
+    # constraints other than MINIMUM_HOURS, or a hole while an absolute global constraint fails
+    def _slot_violates(self, w, d, s):
+        eid = self.state[w, d, s]
+        if eid == UNFILLED_ID:
+            return any(gc.ctype == constraintType.ABSOLUTE and not gc.isSatisfied(self.state, w, d, s)
+                       for gc in self.balancer.constraints)
+        return any(c.key is not validStaffConstraint.MINIMUM_HOURS and not c.isSatisfied(self.state, w, d, s)
+                   for c in employeeById(eid).getConstraints())
+
+    # slots whose constraint checks can see changes, a list of (w, d, s, old id, new id) already applied: the changed
+    # slots, every slot of a changed employee within the weeks the change reaches, and every hole when one was
+    # filled or opened (the global checks look at all of them)
+    def _touched_slots(self, changes):
+        W = self.state.shape[0]
+        touched = set()
+        for w, d, s, old, new in changes:
+            touched.add((w, d, s))
+            for e in (old, new):
+                if e == UNFILLED_ID:
+                    touched.update(self.state.slotsOf(UNFILLED_ID))
+                    continue
+                weeks = self._affected_weeks(e, w, d, W)
+                touched.update(slot for slot in self.state.slotsOf(e) if slot[0] in weeks)
+        return touched
+
+    # filled weekday slots whose employee could trade shifts with the one at (w, d, s), in scan order: both are
+    # allowed in each other's shift (pool, shift type and day) and neither already works the other's day
+    # weekends=True also offers weekend slots
+    def _swap_partners(self, w, d, s, weekends=False):
+        e1 = int(self.state[w, d, s])
+        partners = []
+        for e2 in self.domain_batches[(d, s)][1].ids:
+            if e2 == e1:
+                continue
+            for w2, d2, s2 in self.state.slotsOf(e2):
+                if (not weekends and d2 in (weekdays.Saturday.value, weekdays.Sunday.value)) or \
+                        not self.in_domain(e1, w2, d2, s2):
+                    continue
+                if (w2, d2) != (w, d) and (self.state.works(e1, w2, d2) or self.state.works(e2, w, d)):
+                    continue
+                partners.append((w2, d2, s2))
+        return sorted(partners)
+
     # find violations in completed schedule and the best employee to fill them
+    # violating filled weekday slots are visited in order, each taking the first improving swap among its
+    # _swap_partners (delta scored by try_swap); once a whole lap changes nothing the first hole that can be filled
+    # is filled and the laps resume; after a change only the slots it can affect are re-checked and the scan carries
+    # on from the same slot rather than starting over
     def repair_schedule(self, history_epochs, history_score):
         iters = 0
-        improved = True
         W, D, S = self.state.shape
+        weekend = (weekdays.Saturday.value, weekdays.Sunday.value)
+        order = [(w, d, s) for w in range(W) for d in range(D) if d not in weekend for s in range(S)]
+        violating = {(w, d, s) for _, _, w, d, s in self.find_violations() if d not in weekend}
+        current_score = self.score(self.state)
+        history_epochs.append(len(history_epochs) + 1)
+        history_score.append(current_score)
+
+        def recheck(changes):
+            for slot in self._touched_slots(changes):
+                if slot[1] in weekend:
+                    continue
+                if self._slot_violates(*slot):
+                    violating.add(slot)
+                else:
+                    violating.discard(slot)
 
-        while improved:
+        position = idle = 0
+        while violating:
             iters += 1
-            history_epochs.append(len(history_epochs)+1)
-            history_score.append(self.current_score)
-            improved = False
-            current_score = self.score(self.state)
-            violations = self.find_violations()
-
-            # one entry per slot
-            seen = set()
-            slot_vio = []
-            for emp, _, w, d, s in violations:
-                if (w, d, s) not in seen:
-                    seen.add((w, d, s))
-                    slot_vio.append((emp, w, d, s))
-
-            for emp, w, d, s in slot_vio:
-                if d in (weekdays.Saturday.value, weekdays.Sunday.value):
-                    continue
-                if emp is self.unfilled:
-                    # try fill hole
-                    cand = self._select_employee_for_slot(self.state, w, d, s, self.hours_used)
+            changes = None
+            if idle < len(order):
+                w, d, s = order[position]
+                emp = self.state[w, d, s]
+                if (w, d, s) in violating and emp != UNFILLED_ID:
+                    # try swapping this violation with every compatible filled slot
+                    for w2, d2, s2 in self._swap_partners(w, d, s):
+                        emp2 = self.state[w2, d2, s2]
+                        new_score = self.try_swap(w, d, s, w2, d2, s2, current_score)
+                        if new_score is not None:
+                            current_score = new_score
+                            changes = [(w, d, s, emp, emp2), (w2, d2, s2, emp2, emp)]
+                            break
+                if not changes:
+                    position = (position + 1) % len(order)
+                    idle += 1
+            else:
+                # no swap helps any filled violation, so fill the first hole that can be filled
+                for w, d, s in order:
+                    if (w, d, s) not in violating or self.state[w, d, s] != UNFILLED_ID:
+                        continue
+                    cand = self._select_employee_for_slot(self.state, w, d, s)
                     if cand is not self.unfilled:
                         print(f"Filling hole at {w}{d}{s} with {cand.name}")
-                        self.state[w, d, s] = cand
-                        improved = True
+                        current_score += self._score_counts(*self._seen_delta([(w, d, s, cand.id)]))
+                        self.state[w, d, s] = cand.id
+                        changes = [(w, d, s, UNFILLED_ID, cand.id)]
                         break
-                else:
-                    # try swapping this violation with every other filled slot
-                    done = False
-                    for w2 in range(W):
-                        for d2 in range(D):
-                            if d2 in (weekdays.Saturday.value, weekdays.Sunday.value):
-                                continue
-                            for s2 in range(S):
-                                emp2 = self.state[w2, d2, s2]
-                                if emp2 is self.unfilled or (w2,d2,s2)==(w,d,s):
-                                    continue
-                                if (any(self.state[w2,d2,:]) is emp) or (any(self.state[w,d,:]) is emp2):
-                                    continue
-                                if self.try_swap(w, d, s, w2, d2, s2, current_score):
-                                    improved = done = True
-                                    break
-                            if done: break
-                        if done: break
-                    if improved:
-                        break
-
-        print("Finished repairs in", iters, "iterations." if improved else f"No further repairs after {iters} epochs")
-        # ensure numpy shape
-        self.state = np.array(self.state)
+                if not changes:
+                    break
+            if changes:
+                recheck(changes)
+                history_epochs.append(len(history_epochs) + 1)
+                history_score.append(current_score)
+                idle = 0
+
+        print(f"Finished repairs in {iters} steps, {len(history_score) - 1} changes")
+        slot_vio = [(employeeById(self.state[slot]), *slot) for slot in sorted(violating)]
         return self.state, history_epochs, history_score, slot_vio
 
     # swap method to reassign 2 employees to each other's shifts and check constraints
-    # if improved, keep and return True, otherwise revert and return false
+    # if improved, keep it and return the new score, otherwise leave the state as it was and return None
     def try_swap(self, w, d, s, w2, d2, s2, current_score):
         emp1 = self.state[w, d, s]
         emp2 = self.state[w2, d2, s2]
-        # swap
-        self.state[w, d, s], self.state[w2, d2, s2] = emp2, emp1
-        # check absolute constraints on both
-        for (ww, dd, ss, e) in ((w,d,s,emp2), (w2,d2,s2,emp1)):
-            for c in e.getConstraints():
-                if c.ctype == constraintType.ABSOLUTE and not c.isSatisfied(self.state, ww, dd, ss):
-                    self.state[w, d, s], self.state[w2, d2, s2] = emp1, emp2
-                    return False
-        new_score = self.score(self.state)
+        # check hard feasibility on both
+        if not self.swap_feasible(w, d, s, w2, d2, s2):
+            return None
+        new_score = current_score + self._score_counts(*self._seen_delta([(w, d, s, emp2), (w2, d2, s2, emp1)]))
         if new_score < current_score:
-            print(f"Repair: swapped {emp1.name}@{w}{d}{s} with {emp2.name}@{w2}{d2}{s2} "
+            self.state[w, d, s], self.state[w2, d2, s2] = emp2, emp1
+            print(f"Repair: swapped {employeeById(emp1).name}@{w}{d}{s} with {employeeById(emp2).name}@{w2}{d2}{s2} "
                   f"{current_score}→{new_score}")
-            return True
-        self.state[w, d, s], self.state[w2, d2, s2] = emp1, emp2
-        return False
+            return new_score
+        return None
     
+    # slots of eid whose vacating could clear absolute constraint c failing at (w, d, s), the constraint's scope,
+    # and the slots eid could take to clear it instead (only MINIMUM_HOURS, which more shifts satisfy)
+    def _violation_scope(self, c, eid, w, d, s):
+        W, D, _ = self.state.shape
+        held = self.state.slotsOf(eid)
+        key = c.key
+        if key is validStaffConstraint.MINIMUM_HOURS:
+            window = range(w - 1, min(w + 2, W))
+            return [], sorted((w2, d2, s2) for w2 in window for d2 in range(D) for s2 in range(3)
+                              if self.state[w2, d2, s2] != eid)
+        if key is validStaffConstraint.ONE_PER_DAY:
+            scope = [slot for slot in held if slot[:2] == (w, d)]
+        elif key is validStaffConstraint.NO_DAY_AFTER_NIGHT:
+            t = w * D + d
+            near = [(t + 1, 0), (t + 1, 1)] if s == 2 else [(t - 1, 2), (t - 2, 2)]
+            scope = [(w, d, s)] + [(*divmod(u % (W * D), D), k) for u, k in near]
+        elif key is validStaffConstraint.DAYSHIFTS_PER_WEEK:
+            scope = [slot for slot in held if slot[0] == w and slot[2] < 2]
+        elif key is validStaffConstraint.NIGHTSHIFTS_PER_WEEK:
+            scope = [slot for slot in held if slot[0] == w and slot[2] == 2]
+        elif key in (validStaffConstraint.CONSECUTIVE_DAYS, validStaffConstraint.OVERLOADED, validStaffConstraint.MIN_REST):
+            scope = [slot for slot in held if slot[0] == w]
+        elif key is validStaffConstraint.HOURS_PER_PAY_PERIOD:
+            scope = [slot for slot in held if slot[0] in (w - 1, w)]
+        elif key is validStaffConstraint.WEEKEND_ROTATION:
+            scope = [slot for slot in held if slot[1] in (weekdays.Saturday.value, weekdays.Sunday.value)]
+        elif key is not None and key.name.startswith('CAN_WORK'):
+            scope = [(w, d, s)]
+        else:
+            scope = list(held)
+        return sorted(slot for slot in set(scope) if slot in held), []
+
+    # absolute violations as a live set of (w, d, s) slots, re-checked only where a change can reach
+    # each violated slot is offered the moves its failing constraints' scopes allow: handing a scope slot to another
+    # employee of its domain, trading it with one of its _swap_partners (weekends included), or for MINIMUM_HOURS
+    # taking over a slot in the window; the reassignment that lowers the score most is taken, or failing one the
+    # best swap
+    # a slot with no improving move is settled until a change touches it; once every violation is settled the
+    # first hole that can be filled is filled, as in repair, and the sweep resumes
+    # violations left at the end are reported, as unfixable when no move in their scopes lowers the absolute count
     def finalPass(self, history_epochs, history_scores):
         self.balancer.state = self.state
-        _, _, staff_abs, _ , _= self.balancer.numViolations(schedule=self.state)
-
-        # keep looping on *only* absolute violations
-        while staff_abs > 0:
-            history_epochs.append(len(history_epochs)+1)
-            history_scores.append(self.score(self.state))
-            print(f"Extra abs‐fix pass: {staff_abs} absolute violations remain")
-            W, D, S = self.state.shape
+        W, D, S = self.state.shape
+        order = [(w, d, s) for w in range(W) for d in range(D) for s in range(S)]
+        current_score = self.score(self.state)
+
+        def failing(slot):
+            eid = self.state[slot]
+            if eid == UNFILLED_ID:
+                return []
+            return [c for c in employeeById(eid).absolute if not c.isSatisfied(self.state, *slot)]
+
+        broken = {slot for slot in order if failing(slot)}
+        settled = {}  # slot -> True when some move in its scopes would lower the absolute count
+        if broken:
+            print(f"Final sweep: {len(broken)} slots with absolute violations")
+
+        # the scopes' reassignments, or with swaps=True their swaps, each move a tuple of (slot, old id, new id)
+        def moves(slot, swaps=False):
+            eid = int(self.state[slot])
+            found = set()
+            for c in failing(slot):
+                vacate, take = self._violation_scope(c, eid, *slot)
+                for x in vacate:
+                    e1 = int(self.state[x])
+                    if swaps:
+                        for y in self._swap_partners(*x, weekends=True):
+                            e2 = int(self.state[y])
+                            found.add(tuple(sorted([(x, e1, e2), (y, e2, e1)])))
+                    else:
+                        found.update(((x, e1, int(f)),) for f in self.domain_batches[x[1:]][1].ids
+                                     if f != e1 and not self.state.works(f, *x[:2]))
+                if not swaps:
+                    found.update(((x, int(self.state[x]), eid),) for x in take
+                                 if self.in_domain(eid, *x) and not self.state.works(eid, *x[:2]))
+            return sorted(found)
+
+        def apply(changes):
+            nonlocal current_score
+            current_score += self.score_delta(self.state, [(*x, new) for x, _, new in changes])
+            for x, _, new in changes:
+                self.state[x] = new
+            for slot in self._touched_slots([(*x, old, new) for x, old, new in changes]):
+                settled.pop(slot, None)
+                if failing(slot):
+                    broken.add(slot)
+                else:
+                    broken.discard(slot)
+            history_epochs.append(len(history_epochs) + 1)
+            history_scores.append(current_score)
 
-            # find the first absolute violation slot
-            found = False
-            for w in range(W):
-                if found: break
-                for d in range(D):
-                    if found: break
-                    for s in range(S):
-                        emp = self.state[w,d,s]
-                        if emp is self.unfilled: 
-                            slot_emp = self.unfilled
-                        else:
-                            abs_bads = [c for c in emp.getConstraints()
-                                        if c.ctype == constraintType.ABSOLUTE
-                                        and not c.isSatisfied(self.state, w, d, s)]
-                            if not abs_bads:
-                                continue
-                            slot_emp = emp
-
-                        candidate = self._select_employee_for_slot(self.state, w, d, s, self.hours_used)
-                        if candidate is not self.unfilled and candidate is not slot_emp:
-                            print(f"  fixing ABS slot {w}{d}{s}: {slot_emp.name} → {candidate.name}")
-                            if slot_emp is not self.unfilled:
-                                self.hours_used[w][slot_emp] -= SHIFTLENGTH
-                            self.state[w,d,s] = candidate
-                            self.hours_used[w][candidate] += SHIFTLENGTH
-                            found = True
-                            break
-            if not found:
-                # nothing fillable — try pair‐wise swap:
-                # look for two slots whose swap removes an absolute
-                for w1 in range(W):
-                    for d1 in range(D):
-                        for s1 in range(S):
-                            e1 = self.state[w1,d1,s1]
-                            if e1 is self.unfilled:
-                                continue
-                            if all(c.isSatisfied(self.state,w1,d1,s1) for c in e1.getConstraints() if c.ctype==constraintType.ABSOLUTE):
-                                continue
-
-                            for w2 in range(W):
-                                for d2 in range(D):
-                                    for s2 in range(S):
-                                        e2 = self.state[w2,d2,s2]
-                                        if e2 is self.unfilled:
-                                            continue
-                                        self.state[w1,d1,s1], self.state[w2,d2,s2] = e2, e1
-                                        ok1 = all(c.isSatisfied(self.state,w1,d1,s1)
-                                                for c in e2.getConstraints() if c.ctype==constraintType.ABSOLUTE)
-                                        ok2 = all(c.isSatisfied(self.state,w2,d2,s2)
-                                                for c in e1.getConstraints() if c.ctype==constraintType.ABSOLUTE)
-                                        if ok1 and ok2:
-                                            print(f"  swap ABS fix: ({w1}{d1}{s1}){e1.name}↔({w2}{d2}{s2}){e2.name}")
-                                            found = True
-                                            break
-                                        # undo
-                                        self.state[w1,d1,s1], self.state[w2,d2,s2] = e1, e2
-                                    if found: break
-                                if found: break
-                            if found: break
-                        if found: break
-                    if found: break
-
-            if not found:
-                # if we couldn’t fix any slot, bail out to avoid infinite loop
-                print("Could not repair an absolute violation — giving up.")
+        while True:
+            changed = False
+            for slot in sorted(broken):
+                if slot not in broken or slot in settled:
+                    continue
+                best, clears = None, False
+                for swaps in (False, True):
+                    for move in moves(slot, swaps):
+                        counts = self._violation_delta(self.state, [(*x, new) for x, _, new in move])
+                        clears = clears or (counts[2] < 0 and counts[4] <= 0)
+                        delta = self._score_counts(*counts)
+                        if delta < 0 and (best is None or delta < best[0]):
+                            best = (delta, move)
+                    if best is not None:
+                        break
+                if best is None:
+                    settled[slot] = clears
+                    continue
+                print(f"  ABS fix at {slot[0]}{slot[1]}{slot[2]}: " +
+                      ", ".join(f"{employeeById(old).name}→{employeeById(new).name}@{x[0]}{x[1]}{x[2]}"
+                                for x, old, new in best[1]))
+                apply(best[1])
+                changed = True
+            if changed:
+                continue
+            for w, d, s in sorted(self.state.slotsOf(UNFILLED_ID)):
+                cand = self._select_employee_for_slot(self.state, w, d, s)
+                if cand is not self.unfilled and self.score_delta(self.state, [(w, d, s, cand.id)]) < 0:
+                    print(f"  filling hole at {w}{d}{s} with {cand.name}")
+                    apply([((w, d, s), UNFILLED_ID, cand.id)])
+                    changed = True
+                    break
+            if not changed:
                 break
 
-            # re‐count remaining absolute violations
-            _ , _, staff_abs, _, _ = self.balancer.numViolations()
+        for slot in sorted(broken):
+            names = ", ".join(c.name for c in failing(slot))
+            where = f"{employeeById(self.state[slot]).name} at {slot[0]}{slot[1]}{slot[2]} ({names})"
+            if settled.get(slot):
+                print(f"Unresolved: {where}, every move in its scope that clears it costs more elsewhere")
+            else:
+                print(f"Unfixable: {where}, no reassignment or swap in its scope lowers the absolute count")
         return self.state, history_epochs, history_scores
 
+    # give underworked employees the holes of their short pay periods
+    # deficits maps (employee id, pay period start) to the shifts still missing and holes maps each pay period start
+    # to its holes; both are kept up to date as shifts are placed rather than rebuilt
+    # a deficit's plan places up to the missing shifts one after another, each in the hole with the best delta score
+    # (minus a reward for progress towards the minimum) that can_place allows without breaking an absolute global
+    # rule, and keeps its best-scoring prefix; the best plan over all deficits is applied while it does not cost
+    # score, and only plans near the placed shifts are worked out again
     def finalFillMinimums(self, history_epochs, history_scores):
-        W, D, S = self.state.shape
+        W = self.state.shape[0]
         SH = SHIFTLENGTH
-
-        def collect_underworked():
-            uw = {}
-            for emp in self.allPool:
-                if emp is self.unfilled:
-                    continue
-                min_h = next((c.val for c in emp.getConstraints()
-                            if c.name == validStaffConstraint.MINIMUM_HOURS.value), None)
-                if min_h is None:
-                    continue
-                for pp_start in range(0, W, 2):
-                    used = sum(
-                        SH for w in range(pp_start, min(pp_start+2, W))
-                        for d in range(D)
-                        for s in range(S)
-                        if self.state[w,d,s] is emp
-                    )
-                    missing = min_h - used
-                    if missing > 0:
-                        shifts_needed = (missing + SH - 1) // SH
-                        uw.setdefault(emp, []).append((pp_start, shifts_needed))
-            return uw
-
-        def all_holes():
-            return [
-                (w,d,s)
-                for w in range(W)
-                for d in range(D)
-                for s in range(S)
-                if self.state[w,d,s] is self.unfilled
-            ]
-
-        def is_feasible(emp, w, d, s):
-            if self.state[w,d,s] is not self.unfilled:
-                return False
-            self.state[w,d,s] = emp
-            for c in emp.getConstraints():
-                if c.ctype == constraintType.ABSOLUTE and not c.isSatisfied(self.state, w, d, s):
-                    self.state[w,d,s] = self.unfilled
-                    return False
-            for gc in self.balancer.constraints:
-                if gc.ctype == constraintType.ABSOLUTE and not gc.isSatisfied(self.state, None, None, None):
-                    self.state[w,d,s] = self.unfilled
-                    return False
-            self.state[w,d,s] = self.unfilled
-            return True
-
-        def hours_in_pp(emp, pp_start):
-            return sum(
-                SH for w in range(pp_start, min(pp_start+2, W))
-                for d in range(D)
-                for s in range(S)
-                if self.state[w,d,s] is emp
-            )
-
-        def apply_plan(plan):
-            for emp, (w,d,s) in plan:
-                self.state[w,d,s] = emp
-                self.hours_used[w][emp] += SH
-
-        def revert_plan(plan):
-            for emp, (w,d,s) in plan:
-                self.state[w,d,s] = self.unfilled
-                self.hours_used[w][emp] -= SH
-
+        minimums = {emp.id: emp.limit(validStaffConstraint.MINIMUM_HOURS) for emp in self.allPool
+                    if emp is not self.unfilled and emp.limit(validStaffConstraint.MINIMUM_HOURS) is not None}
+        current_score = self.score(self.state)
+
+        def shifts_needed(eid, pp_start):
+            missing = minimums[eid] - self.state.payPeriodHours(eid, pp_start)
+            return int((missing + SH - 1) // SH) if missing > 0 else 0
+
+        deficits = {(eid, pp_start): shifts_needed(eid, pp_start) for eid in minimums for pp_start in range(0, W, 2)}
+        deficits = {key: n for key, n in deficits.items() if n > 0}
+        holes = {}
+        for w, d, s in sorted(self.state.slotsOf(UNFILLED_ID)):
+            holes.setdefault(2 * (w // 2), []).append((w, d, s))
+
+        # (value, [slots]) for the best prefix of the deficit's plan, value None when no hole can be taken
+        # the plan is laid out on self.state to score each next step and taken back up, outside the move journal
+        def plan(eid, pp_start):
+            min_h, max_h = minimums[eid], employeeById(eid).limit(validStaffConstraint.HOURS_PER_PAY_PERIOD)
+            hours = self.state.payPeriodHours(eid, pp_start)
+            taken, total, best = [], 0, (None, [])
+            with self.state.untracked():
+                for _ in range(deficits[(eid, pp_start)]):
+                    step = None
+                    for hole in holes.get(pp_start, []):
+                        if hole in taken or not self.can_place(self.state, eid, *hole):
+                            continue
+                        counts = self._seen_delta([(*hole, eid)])
+                        if counts[0] > 0:
+                            continue
+                        value = self._score_counts(*counts)
+                        if max_h is None or hours + SH <= max_h:
+                            if hours + SH < min_h:
+                                value -= 100  # reward partial progress
+                            else:
+                                value -= 500  # reward full fix
+                        if step is None or value < step[0]:
+                            step = (value, hole)
+                    if step is None:
+                        break
+                    self.state[step[1]] = eid
+                    taken.append(step[1])
+                    total += step[0]
+                    hours += SH
+                    if best[0] is None or total < best[0]:
+                        best = (total, list(taken))
+                for hole in taken:
+                    self.state[hole] = UNFILLED_ID
+            return best
+
+        plans = {key: plan(*key) for key in deficits}
+        history_epochs.append(len(history_epochs)+1)
+        history_scores.append(current_score)
         while True:
-            history_epochs.append(len(history_epochs)+1)
-            history_scores.append(self.score(self.state))
-            underworked = collect_underworked()
-            if not underworked:
+            ready = [(value, key) for key, (value, _) in plans.items() if value is not None]
+            if not ready:
                 break
-
-            holes = all_holes()
-            base_score = self.score(self.state)
-            best_delta = float('inf')
-            best_plan = None
-
-            for emp, needs in underworked.items():
-                for pp_start, shifts_needed in needs:
-                    before_hours = hours_in_pp(emp, pp_start)
-                    for hole in holes:
-                        w, d, s = hole
-                        if not is_feasible(emp, w, d, s):
-                            continue
-                        if not (pp_start <= w < pp_start+2):
-                            continue  
-
-                        plan = [(emp, hole)]
-                        apply_plan(plan)
-                        after_hours = hours_in_pp(emp, pp_start)
-                        delta = self.score(self.state) - base_score
-
-                        min_h = next((c.val for c in emp.getConstraints()
-                                    if c.name == validStaffConstraint.MINIMUM_HOURS.value), None)
-                        max_h = next((c.val for c in emp.getConstraints()
-                                    if c.name == validStaffConstraint.HOURS_PER_PAY_PERIOD.value), None)
-                        if min_h is not None:
-                            if (before_hours < after_hours < min_h) and after_hours <= max_h:
-                                delta -= 100  # reward partial progress
-                            elif (before_hours < min_h <= after_hours) and after_hours <= max_h:
-                                delta -= 500  # reward full fix
-
-                        revert_plan(plan)
-                        if delta < best_delta:
-                            best_delta, best_plan = delta, plan
-
-            if best_plan is None or best_delta > 0:
+            value, (eid, pp_start) = min(ready)
+            if value > 0:
                 break
-
-            apply_plan(best_plan)
+            # global rules can move a plan's value from afar, so the winner is worked out again before it is used
+            fresh = plan(eid, pp_start)
+            if fresh != plans[(eid, pp_start)]:
+                plans[(eid, pp_start)] = fresh
+                continue
+            placed = plans[(eid, pp_start)][1]
+            current_score += self.score_delta(self.state, [(*hole, eid) for hole in placed])
+            for hole in placed:
+                self.state[hole] = eid
+                holes[pp_start].remove(hole)
+            need = shifts_needed(eid, pp_start)
+            if need:
+                deficits[(eid, pp_start)] = need
+            else:
+                del deficits[(eid, pp_start)]
+            # the placed shifts reach the employee's own plans in the weeks they affect and take holes out of
+            # every plan for their pay period
+            weeks = set().union(*(self._affected_weeks(eid, w, d, W) for w, d, _ in placed))
+            plans = {key: (plan(*key) if key[1] == pp_start or (key[0] == eid and weeks & {key[1], key[1] + 1})
+                           else plans[key]) for key in deficits}
+            history_epochs.append(len(history_epochs)+1)
+            history_scores.append(current_score)
         return self.state, history_epochs, history_scores
@@ -1,7 +1,13 @@
 import numpy as np
 from enum import Enum
+from functools import lru_cache
+from collections import deque, OrderedDict
+from contextlib import contextmanager
 
 HOURSPERSHIFT = 12
+UNFILLED_ID = 0          # reserved employee id for an empty slot
+STATE_DTYPE = np.int16   # schedules are (weeks, days, slots) arrays of employee ids
+ZOBRIST_SEED = 0x5EED    # schedule hashes are the same in every process for the same grid
 
 class weekdays(Enum):
     Monday = 0
@@ -40,223 +46,571 @@ class validGlobalConstraint(Enum):
     D2_SHIFTS_FILLED = 'Dayshifts 2 Filled'
     NIGHT_SHIFTS_FILLED = 'Nightshifts Filled'
 
-#contraint class defines constraints and contains methods for adding, removing, and checking constraint satisfaction in the current state
-class Constraint:
-    def __init__(self, name: str, val: float, ctype: constraintType):
-        self.name = name
-        self.val = val
-        self.ctype = ctype
+# (weeks, days) mask of D2 slots that must be filled, Tue/Fri are downstaffed and odd-week weekends are off
+@lru_cache(maxsize=None)
+def d2RequiredMask(weeks: int) -> np.ndarray:
+    mask = np.ones((weeks, 7), dtype=bool)
+    mask[:, [weekdays.Tuesday.value, weekdays.Friday.value]] = False
+    mask[1::2, [weekdays.Saturday.value, weekdays.Sunday.value]] = False
+    mask.flags.writeable = False
+    return mask
 
-    def isSatisfied(self, schedule: np.ndarray, week: int, day: int, slot: int) -> bool:
-        W, D, S = schedule.shape
+# registry of compiled constraint checkers, keyed by constraint name (the enum value)
+# each entry is a factory (key, val) -> check with the constraint's parameters already bound
+# global checks are check(schedule), staff checks are check(schedule, emp, week, day, slot) and only see filled slots
+# to add a new constraint kind, add it to validStaffConstraint/validGlobalConstraint and register a factory here
+constraintCheckers: dict = {}
 
-        # Global: dayshift slot 0
-        if self.name == validGlobalConstraint.D1_SHIFTS_FILLED.value:
-            for w in range(W):
-                for d in range(D):
-                    e = schedule[w, d, 0]
-                    if not e or getattr(e, 'name', None) == 'UNFILLED':
-                        return False
-            return True
+def constraintChecker(*keys):
+    def register(factory):
+        for key in keys:
+            constraintCheckers[key.value] = (key, factory)
+        return factory
+    return register
 
-        # Global: dayshift slot 1, skip Tue/Fri and biweekly weekend off
-        if self.name == validGlobalConstraint.D2_SHIFTS_FILLED.value:
-            for w in range(W):
-                for d in range(D):
-                    if d in (weekdays.Tuesday.value, weekdays.Friday.value):
-                        continue
-                    if d in (weekdays.Saturday.value, weekdays.Sunday.value) and (w % 2) == 1:
-                        continue
-                    e = schedule[w, d, 1]
-                    if not e or getattr(e, 'name', None) == 'UNFILLED':
-                        return False
-            return True
+# Global: dayshift slot 0
+@constraintChecker(validGlobalConstraint.D1_SHIFTS_FILLED)
+def _d1Filled(key, val):
+    def check(schedule):
+        return not (schedule.grid[:, :, 0] == UNFILLED_ID).any()
+    return check
 
-        # Global: night shifts
-        if self.name == validGlobalConstraint.NIGHT_SHIFTS_FILLED.value:
-            for w in range(W):
-                for d in range(D):
-                    e = schedule[w, d, 2]
-                    if not e or getattr(e, 'name', None) == 'UNFILLED':
-                        return False
-            return True
+# Global: dayshift slot 1, skip Tue/Fri and biweekly weekend off
+@constraintChecker(validGlobalConstraint.D2_SHIFTS_FILLED)
+def _d2Filled(key, val):
+    def check(schedule):
+        return not (schedule.grid[:, :, 1][d2RequiredMask(schedule.shape[0])] == UNFILLED_ID).any()
+    return check
 
-        # Skip empty/unfilled for staff rules
-        emp = schedule[week, day, slot]
-        if not emp or getattr(emp, 'name', None) == 'UNFILLED':
-            return True
+# Global: night shifts
+@constraintChecker(validGlobalConstraint.NIGHT_SHIFTS_FILLED)
+def _nightsFilled(key, val):
+    def check(schedule):
+        return not (schedule.grid[:, :, 2] == UNFILLED_ID).any()
+    return check
 
-        # HOURS_PER_PAY_PERIOD
-        if self.name == validStaffConstraint.HOURS_PER_PAY_PERIOD.value:
-            if week % 2 == 0:
-                return True  # only check at end of pay period
-
-            start = week-1
-            end = week+1
-            total = 0
-            for w in range(start, end):
-                for d in range(D):
-                    for s in range(S):
-                        if schedule[w, d, s] is emp:
-                            total += HOURSPERSHIFT
-            return total <= self.val
-        
-        if self.name == validStaffConstraint.ONE_PER_DAY.value:
-            cnt = sum(1 for s in range(S) if schedule[week, day, s] is emp)
-            return cnt <= 1
-
-        # DAYSHIFTS_PER_WEEK (slots 0 & 1)
-        if self.name == validStaffConstraint.DAYSHIFTS_PER_WEEK.value:
-            cnt = sum(
-                1
-                for d in range(D)
-                for s in (0, 1)
-                if schedule[week, d, s] is emp
-            )
-            return cnt <= self.val
-
-        # NIGHTSHIFTS_PER_WEEK (slot 2)
-        if self.name == validStaffConstraint.NIGHTSHIFTS_PER_WEEK.value:
-            cnt = sum(
-                1
-                for d in range(D)
-                if schedule[week, d, 2] is emp
-            )
-            return cnt <= self.val
-        
-        if self.name == validStaffConstraint.OVERLOADED.value:
-            cnt = sum(
-                1
-                for d in range(D)
-                if schedule[week, d, :] is emp
-            )
-            return cnt < self.val
-
-        # CAN_WORK_X constraints
-        day_map = {
-            validStaffConstraint.CAN_WORK_MONDAY.value:    weekdays.Monday.value,
-            validStaffConstraint.CAN_WORK_TUESDAY.value:   weekdays.Tuesday.value,
-            validStaffConstraint.CAN_WORK_WEDNESDAY.value: weekdays.Wednesday.value,
-            validStaffConstraint.CAN_WORK_THURSDAY.value:  weekdays.Thursday.value,
-            validStaffConstraint.CAN_WORK_FRIDAY.value:    weekdays.Friday.value,
-            validStaffConstraint.CAN_WORK_SATURDAY.value:  weekdays.Saturday.value,
-            validStaffConstraint.CAN_WORK_SUNDAY.value:    weekdays.Sunday.value,
-        }
-        if self.name in day_map:
-            if day == day_map[self.name] and not bool(self.val):
-                return False
+@constraintChecker(validStaffConstraint.HOURS_PER_PAY_PERIOD)
+def _hoursPerPayPeriod(key, val):
+    def check(schedule, emp, week, day, slot):
+        if week % 2 == 0:
+            return True  # only check at end of pay period
+        return schedule.hoursInWeeks(emp, week - 1, week + 1) <= val
+    return check
+
+@constraintChecker(validStaffConstraint.ONE_PER_DAY)
+def _onePerDay(key, val):
+    def check(schedule, emp, week, day, slot):
+        return schedule.shiftsOnDay(emp, week, day) <= 1
+    return check
+
+# DAYSHIFTS_PER_WEEK (slots 0 & 1)
+@constraintChecker(validStaffConstraint.DAYSHIFTS_PER_WEEK)
+def _dayShiftsPerWeek(key, val):
+    def check(schedule, emp, week, day, slot):
+        return schedule.dayShifts(emp, week) <= val
+    return check
+
+# NIGHTSHIFTS_PER_WEEK (slot 2)
+@constraintChecker(validStaffConstraint.NIGHTSHIFTS_PER_WEEK)
+def _nightShiftsPerWeek(key, val):
+    def check(schedule, emp, week, day, slot):
+        return schedule.nightShifts(emp, week) <= val
+    return check
+
+@constraintChecker(validStaffConstraint.OVERLOADED)
+def _overloaded(key, val):
+    def check(schedule, emp, week, day, slot):
+        cnt = sum(
+            1
+            for d in range(schedule.shape[1])
+            if schedule[week, d, :] is emp
+        )
+        return cnt < val
+    return check
+
+# weekday a CAN_WORK_X constraint refers to, taken from its name
+def canWorkDay(key: 'validStaffConstraint') -> int:
+    return weekdays[key.name[len('CAN_WORK_'):].capitalize()].value
+
+# CAN_WORK_X constraints, the weekday is bound from the constraint name
+@constraintChecker(validStaffConstraint.CAN_WORK_MONDAY, validStaffConstraint.CAN_WORK_TUESDAY,
+                   validStaffConstraint.CAN_WORK_WEDNESDAY, validStaffConstraint.CAN_WORK_THURSDAY,
+                   validStaffConstraint.CAN_WORK_FRIDAY, validStaffConstraint.CAN_WORK_SATURDAY,
+                   validStaffConstraint.CAN_WORK_SUNDAY)
+def _canWork(key, val):
+    blocked = canWorkDay(key)
+    if bool(val):
+        def check(schedule, emp, week, day, slot):
             return True
+    else:
+        def check(schedule, emp, week, day, slot):
+            return day != blocked
+    return check
 
-        # WEEKEND_ROTATION: allow up to 1 back-to-back weekend (i.e., max 2 in a row)
-        if self.name == validStaffConstraint.WEEKEND_ROTATION.value:
-            # Collect all weeks where employee worked a weekend shift
-            worked_weekends = []
-            for w in range(W):
-                if any(
-                    schedule[w, d, s] is emp
-                    for d in (weekdays.Saturday.value, weekdays.Sunday.value)
-                    for s in range(S)
-                ):
-                    worked_weekends.append(w)
-
-            if not worked_weekends:
-                return True  # No weekends worked, so valid
-
-            max_run = curr_run = 1
-            prev_week = worked_weekends[0]
-            for w in worked_weekends[1:]:
-                if w == prev_week + 1:
-                    curr_run += 1
-                else:
-                    curr_run = 1
-                max_run = max(max_run, curr_run)
-                prev_week = w
-
-            # Allow up to 2 consecutive weekends (1 back-to-back)
-            return max_run <= 2
-
-
-        # CONSECUTIVE_DAYS: no more than value contiguous days
-        if self.name == validStaffConstraint.CONSECUTIVE_DAYS.value:
-            worked = [
-                any(schedule[week, d, s] is emp for s in range(S))
-                for d in range(D)
-            ]
-            max_run = curr = 0
-            for wkd in worked:
-                if wkd:
-                    curr += 1
-                    max_run = max(max_run, curr)
-                else:
-                    curr = 0
-            return max_run <= self.val
-
-        # No day shifts for 2 days after working a night shift,
-        # and no night shifts if the next day has a scheduled day shift
-        if self.name == validStaffConstraint.NO_DAY_AFTER_NIGHT.value:
-            W, D, S = schedule.shape
-
-            if slot in (0, 1):  # day shift
-                # Look back 1–2 days for prior night shifts
-                for offset in (1, 2):
-                    new_day = day - offset
-                    week_delta, neighbour_day = divmod(new_day, D)
-                    neighbour_week = (week + week_delta) % W
-                    if schedule[neighbour_week, neighbour_day, 2] is emp:
-                        return False
-
-            elif slot == 2:  # night shift
-                # Look ahead 1 day for next-day day shifts
-                new_day = day + 1
-                week_delta, neighbour_day = divmod(new_day, D)
+# WEEKEND_ROTATION: allow up to 1 back-to-back weekend (i.e., max 2 in a row)
+@constraintChecker(validStaffConstraint.WEEKEND_ROTATION)
+def _weekendRotation(key, val):
+    def check(schedule, emp, week, day, slot):
+        # Collect all weeks where employee worked a weekend shift
+        worked_weekends = schedule.weekendWeeks(emp)
+
+        if not worked_weekends:
+            return True  # No weekends worked, so valid
+
+        max_run = curr_run = 1
+        prev_week = worked_weekends[0]
+        for w in worked_weekends[1:]:
+            if w == prev_week + 1:
+                curr_run += 1
+            else:
+                curr_run = 1
+            max_run = max(max_run, curr_run)
+            prev_week = w
+
+        # Allow up to 2 consecutive weekends (1 back-to-back)
+        return max_run <= 2
+    return check
+
+# CONSECUTIVE_DAYS: no more than value contiguous days
+@constraintChecker(validStaffConstraint.CONSECUTIVE_DAYS)
+def _consecutiveDays(key, val):
+    def check(schedule, emp, week, day, slot):
+        max_run = curr = 0
+        for wkd in schedule.workedDays(emp, week):
+            if wkd:
+                curr += 1
+                max_run = max(max_run, curr)
+            else:
+                curr = 0
+        return max_run <= val
+    return check
+
+# No day shifts for 2 days after working a night shift,
+# and no night shifts if the next day has a scheduled day shift
+@constraintChecker(validStaffConstraint.NO_DAY_AFTER_NIGHT)
+def _noDayAfterNight(key, val):
+    def check(schedule, emp, week, day, slot):
+        W, D, S = schedule.shape
+        grid = schedule.grid
+
+        if slot in (0, 1):  # day shift
+            # Look back 1–2 days for prior night shifts
+            for offset in (1, 2):
+                week_delta, neighbour_day = divmod(day - offset, D)
                 neighbour_week = (week + week_delta) % W
-                if schedule[neighbour_week, neighbour_day, 0] is emp or schedule[neighbour_week, neighbour_day, 1] is emp:
+                if grid[neighbour_week, neighbour_day, 2] == emp:
                     return False
 
+        elif slot == 2:  # night shift
+            # Look ahead 1 day for next-day day shifts
+            week_delta, neighbour_day = divmod(day + 1, D)
+            neighbour_week = (week + week_delta) % W
+            if grid[neighbour_week, neighbour_day, 0] == emp or grid[neighbour_week, neighbour_day, 1] == emp:
+                return False
+
+        return True
+    return check
+
+@constraintChecker(validStaffConstraint.MINIMUM_HOURS)
+def _minimumHours(key, val):
+    def check(schedule, emp, week, day, slot):
+        if week % 2 == 0:
+            return True  # Only check at end of pay period
+        return schedule.hoursInWeeks(emp, week - 1, week + 2) >= val
+    return check
+
+# MIN_REST: at least val days between any two shifts
+@constraintChecker(validStaffConstraint.MIN_REST)
+def _minRest(key, val):
+    rest = int(val)
+    def check(schedule, emp, week, day, slot):
+        D = schedule.shape[1]
+        # If they work the day before or after, that's consecutive and always allowed
+        if schedule.works(emp, week, (day - 1) % D) or schedule.works(emp, week, (day + 1) % D):
             return True
 
-        # MINIMUM_HOURS
-        if self.name == validStaffConstraint.MINIMUM_HOURS.value:
-            if week % 2 == 0:
-                return True  # Only check at end of pay period
-
-            start = week - 1
-            end = min(week + 2, W)  
-            total = 0
-            for w in range(start, end):
-                for d in range(D):
-                    for s in range(S):
-                        if schedule[w, d, s] is emp:
-                            total += HOURSPERSHIFT
-            return total >= self.val
-        
-        # MIN_REST: at least self.val days between any two shifts
-        if self.name == validStaffConstraint.MIN_REST.value:
-            # helper to check if emp works at (w,d)
-            def works(w, d):
-                return any(schedule[w % W, d % D, s] is emp for s in range(S))
-
-            # If they work the day before or after, that's consecutive and always allowed
-            if works(week, day - 1) or works(week, day + 1):
+        # enforce the minimum‐rest window
+        for delta in range(1, rest + 1):
+            if schedule.works(emp, week, (day - delta) % D) or schedule.works(emp, week, (day + delta) % D):
+                return False
+
+        return True
+    return check
+
+# registry of vectorised placement rules, used to score many candidates for one slot in a single pass
+# each entry is a factory key -> rule, rule(state, w, d, s, rows, vals) returns two arrays over rows:
+# atSlot, True where the constraint fails at (w, d, s) once that employee is placed there, and
+# delta, the change in how many of that employee's slots fail the constraint
+# rows are employee ids (repeats allowed) that do not already work day (w, d), vals are their constraint values
+placementRules: dict = {}
+
+def placementRule(*keys):
+    def register(factory):
+        for key in keys:
+            placementRules[key] = factory(key)
+        return factory
+    return register
+
+# longest run of True along the last axis
+def _maxRun(flags: np.ndarray) -> np.ndarray:
+    count = np.cumsum(flags, axis=-1)
+    lastBreak = np.maximum.accumulate(np.where(flags, 0, count), axis=-1)
+    return (count - lastBreak).max(axis=-1, initial=0)
+
+# rules that fail every slot in their scope at once, n is how many slots the employee already has in that scope
+def _wholeScope(n, failsBefore, failsAfter):
+    return failsAfter, (n + 1) * failsAfter - n * failsBefore
+
+def _noChange(rows):
+    return np.zeros(len(rows), dtype=bool), np.zeros(len(rows), dtype=np.int64)
+
+@placementRule(validStaffConstraint.HOURS_PER_PAY_PERIOD)
+def _hoursPerPayPeriodRule(key):
+    def rule(state, w, d, s, rows, vals):
+        end = 2 * (w // 2) + 1  # week the pay period is checked at
+        if end >= state.shape[0]:
+            return _noChange(rows)
+        shifts = state.shiftsInWeeks(rows, end - 1, end + 1)
+        n = state.shiftsInWeeks(rows, end, end + 1)
+        before = shifts * HOURSPERSHIFT > vals
+        after = (shifts + 1) * HOURSPERSHIFT > vals
+        return after & (w == end), (n + (w == end)) * after - n * before
+    return rule
+
+@placementRule(validStaffConstraint.ONE_PER_DAY)
+def _onePerDayRule(key):
+    def rule(state, w, d, s, rows, vals):
+        return _noChange(rows)  # rows are off that day, so they end up with exactly one shift
+    return rule
+
+@placementRule(validStaffConstraint.DAYSHIFTS_PER_WEEK)
+def _dayShiftsPerWeekRule(key):
+    def rule(state, w, d, s, rows, vals):
+        week = state.weekCount[rows, w].astype(np.int64)
+        shifts = week[:, 0] + week[:, 1]
+        return _wholeScope(week.sum(axis=1), shifts > vals, shifts + (s < 2) > vals)
+    return rule
+
+@placementRule(validStaffConstraint.NIGHTSHIFTS_PER_WEEK)
+def _nightShiftsPerWeekRule(key):
+    def rule(state, w, d, s, rows, vals):
+        week = state.weekCount[rows, w].astype(np.int64)
+        shifts = week[:, 2]
+        return _wholeScope(week.sum(axis=1), shifts > vals, shifts + (s == 2) > vals)
+    return rule
+
+@placementRule(validStaffConstraint.OVERLOADED)
+def _overloadedRule(key):
+    def rule(state, w, d, s, rows, vals):
+        fails = ~(0 < vals)
+        return fails, fails.astype(np.int64)
+    return rule
+
+@placementRule(validStaffConstraint.CAN_WORK_MONDAY, validStaffConstraint.CAN_WORK_TUESDAY,
+               validStaffConstraint.CAN_WORK_WEDNESDAY, validStaffConstraint.CAN_WORK_THURSDAY,
+               validStaffConstraint.CAN_WORK_FRIDAY, validStaffConstraint.CAN_WORK_SATURDAY,
+               validStaffConstraint.CAN_WORK_SUNDAY)
+def _canWorkRule(key):
+    blocked = canWorkDay(key)
+    def rule(state, w, d, s, rows, vals):
+        if d != blocked:
+            return _noChange(rows)
+        fails = vals == 0
+        return fails, fails.astype(np.int64)
+    return rule
+
+@placementRule(validStaffConstraint.WEEKEND_ROTATION)
+def _weekendRotationRule(key):
+    def rule(state, w, d, s, rows, vals):
+        weekends = state.dayCount[rows, :, weekdays.Saturday.value:weekdays.Sunday.value + 1].any(axis=2)
+        n = state.weekCount[rows].sum(axis=(1, 2))
+        before = _maxRun(weekends) > 2
+        if d < weekdays.Saturday.value:
+            return _wholeScope(n, before, before)
+        weekends[:, w] = True
+        return _wholeScope(n, before, _maxRun(weekends) > 2)
+    return rule
+
+@placementRule(validStaffConstraint.CONSECUTIVE_DAYS)
+def _consecutiveDaysRule(key):
+    def rule(state, w, d, s, rows, vals):
+        days = state.dayCount[rows, w] > 0
+        n = state.weekCount[rows, w].sum(axis=1)
+        before = _maxRun(days) > vals
+        days[:, d] = True
+        return _wholeScope(n, before, _maxRun(days) > vals)
+    return rule
+
+# the new slot itself, plus the neighbouring shifts whose look-back/look-ahead now sees it
+@placementRule(validStaffConstraint.NO_DAY_AFTER_NIGHT)
+def _noDayAfterNightRule(key):
+    def rule(state, w, d, s, rows, vals):
+        W, D, S = state.shape
+        flat = state.grid.reshape(W * D, S)
+        t = w * D + d
+
+        def nights(offset):
+            return flat[(t + offset) % (W * D), 2] == rows
+
+        def dayShifts(offset):
+            day = flat[(t + offset) % (W * D)]
+            return (day[0] == rows).astype(np.int64) + (day[1] == rows)
+
+        if s in (0, 1):
+            fails = nights(-1) | nights(-2)
+            return fails, fails + nights(-1)
+        fails = dayShifts(1) > 0
+        return fails, fails + dayShifts(1) * ~nights(-1) + dayShifts(2) * ~nights(1)
+    return rule
+
+@placementRule(validStaffConstraint.MINIMUM_HOURS)
+def _minimumHoursRule(key):
+    def rule(state, w, d, s, rows, vals):
+        W = state.shape[0]
+        atSlot, delta = _noChange(rows)
+        # every checked window that contains week w
+        for end in (w - 1, w, w + 1):
+            if end < 1 or end >= W or end % 2 == 0:
+                continue
+            shifts = state.shiftsInWeeks(rows, end - 1, end + 2)
+            n = state.shiftsInWeeks(rows, end, end + 1)
+            before = shifts * HOURSPERSHIFT < vals
+            after = (shifts + 1) * HOURSPERSHIFT < vals
+            delta += (n + (end == w)) * after - n * before
+            if end == w:
+                atSlot = after
+        return atSlot, delta
+    return rule
+
+# days looked at 1, 1, 2, 2, ... back and ahead of each day, wrapping within the week like the checker
+@lru_cache(maxsize=None)
+def _restWindow(reach: int, days: int):
+    offsets = np.repeat(np.arange(1, reach + 1), 2)
+    lookup = (np.arange(days) - (offsets * np.tile([1, -1], reach))[:, None]) % days
+    return offsets, lookup
+
+@placementRule(validStaffConstraint.MIN_REST)
+def _minRestRule(key):
+    def rule(state, w, d, s, rows, vals):
+        rest = vals.astype(np.int64)
+        offsets, lookup = _restWindow(max(int(rest.max(initial=0)), 1), state.shape[1])
+        inReach = offsets <= rest[:, None]
+        counts = state.dayCount[rows, w].astype(np.int64)
+
+        def failing(worked):
+            seen = worked[:, lookup]  # (rows, offsets, days)
+            adjacent = seen[:, 0] | seen[:, 1]
+            near = (seen & inReach[:, :, None]).any(axis=1)
+            return near & ~adjacent
+
+        before = (counts * failing(counts > 0)).sum(axis=1)
+        counts[:, d] += 1
+        fails = failing(counts > 0)
+        return fails[:, d], (counts * fails).sum(axis=1) - before
+    return rule
+
+# registry of batch rules, used to count one constraint's violations over a stack of N schedules at once
+# each entry is a factory (key, val) -> rule; global rules take the (N, W, D, S) id grids and return (N,) satisfied flags,
+# staff rules take occupied, the (N, W, D, S) mask of one employee's slots, and return (N,) failing slot counts,
+# matching what isSatisfied gives summed over that employee's slots
+batchRules: dict = {}
+
+def batchRule(*keys):
+    def register(factory):
+        for key in keys:
+            batchRules[key] = factory
+        return factory
+    return register
+
+@batchRule(validGlobalConstraint.D1_SHIFTS_FILLED)
+def _d1FilledBatch(key, val):
+    def rule(grids):
+        return ~(grids[..., 0] == UNFILLED_ID).any(axis=(1, 2))
+    return rule
+
+@batchRule(validGlobalConstraint.D2_SHIFTS_FILLED)
+def _d2FilledBatch(key, val):
+    def rule(grids):
+        return ~(grids[..., 1][:, d2RequiredMask(grids.shape[1])] == UNFILLED_ID).any(axis=1)
+    return rule
+
+@batchRule(validGlobalConstraint.NIGHT_SHIFTS_FILLED)
+def _nightsFilledBatch(key, val):
+    def rule(grids):
+        return ~(grids[..., 2] == UNFILLED_ID).any(axis=(1, 2))
+    return rule
+
+# shifts per week of the weeks where fails is True, summed per schedule
+def _weeksFailing(occupied, fails):
+    return (occupied.sum(axis=(2, 3)) * fails).sum(axis=1)
+
+# shifts in the pay-period windows checked at the odd weeks, weeks [w - 1, w + span - 1) clipped to the template
+def _oddWindows(occupied, span):
+    W = occupied.shape[1]
+    shifts = np.concatenate([occupied.sum(axis=(2, 3)), np.zeros((len(occupied), span), dtype=np.int64)], axis=1)
+    odd = np.arange(1, W, 2)
+    return odd, sum(shifts[:, odd - 1 + k] for k in range(span))
+
+@batchRule(validStaffConstraint.HOURS_PER_PAY_PERIOD)
+def _hoursPerPayPeriodBatch(key, val):
+    def rule(occupied):
+        odd, shifts = _oddWindows(occupied, 2)
+        return (occupied[:, odd].sum(axis=(2, 3)) * (shifts * HOURSPERSHIFT > val)).sum(axis=1)
+    return rule
+
+@batchRule(validStaffConstraint.MINIMUM_HOURS)
+def _minimumHoursBatch(key, val):
+    def rule(occupied):
+        odd, shifts = _oddWindows(occupied, 3)
+        return (occupied[:, odd].sum(axis=(2, 3)) * (shifts * HOURSPERSHIFT < val)).sum(axis=1)
+    return rule
+
+@batchRule(validStaffConstraint.ONE_PER_DAY)
+def _onePerDayBatch(key, val):
+    def rule(occupied):
+        days = occupied.sum(axis=3)
+        return (days * (days > 1)).sum(axis=(1, 2))
+    return rule
+
+@batchRule(validStaffConstraint.DAYSHIFTS_PER_WEEK)
+def _dayShiftsPerWeekBatch(key, val):
+    def rule(occupied):
+        return _weeksFailing(occupied, occupied[..., :2].sum(axis=(2, 3)) > val)
+    return rule
+
+@batchRule(validStaffConstraint.NIGHTSHIFTS_PER_WEEK)
+def _nightShiftsPerWeekBatch(key, val):
+    def rule(occupied):
+        return _weeksFailing(occupied, occupied[..., 2].sum(axis=2) > val)
+    return rule
+
+# the checker compares a slot row to the employee with "is", which never holds, so only val <= 0 fails
+@batchRule(validStaffConstraint.OVERLOADED)
+def _overloadedBatch(key, val):
+    def rule(occupied):
+        return occupied.sum(axis=(1, 2, 3)) * (not 0 < val)
+    return rule
+
+@batchRule(validStaffConstraint.CAN_WORK_MONDAY, validStaffConstraint.CAN_WORK_TUESDAY,
+           validStaffConstraint.CAN_WORK_WEDNESDAY, validStaffConstraint.CAN_WORK_THURSDAY,
+           validStaffConstraint.CAN_WORK_FRIDAY, validStaffConstraint.CAN_WORK_SATURDAY,
+           validStaffConstraint.CAN_WORK_SUNDAY)
+def _canWorkBatch(key, val):
+    blocked = canWorkDay(key)
+    def rule(occupied):
+        return occupied[:, :, blocked].sum(axis=(1, 2)) * (not bool(val))
+    return rule
+
+@batchRule(validStaffConstraint.WEEKEND_ROTATION)
+def _weekendRotationBatch(key, val):
+    def rule(occupied):
+        weekends = occupied[:, :, weekdays.Saturday.value:weekdays.Sunday.value + 1].any(axis=(2, 3))
+        return occupied.sum(axis=(1, 2, 3)) * (_maxRun(weekends) > 2)
+    return rule
+
+@batchRule(validStaffConstraint.CONSECUTIVE_DAYS)
+def _consecutiveDaysBatch(key, val):
+    def rule(occupied):
+        return _weeksFailing(occupied, _maxRun(occupied.any(axis=3)) > val)
+    return rule
+
+# day shifts 1-2 days after a night, and nights before a day shift, on the template read as one wrapping run of days
+@batchRule(validStaffConstraint.NO_DAY_AFTER_NIGHT)
+def _noDayAfterNightBatch(key, val):
+    def rule(occupied):
+        N, W, D, S = occupied.shape
+        flat = occupied.reshape(N, W * D, S)
+        nights, days = flat[..., 2], flat[..., :2].any(axis=2)
+        afterNight = np.roll(nights, 1, axis=1) | np.roll(nights, 2, axis=1)
+        dayFails = (flat[..., :2].sum(axis=2) * afterNight).sum(axis=1)
+        return dayFails + (nights & np.roll(days, -1, axis=1)).sum(axis=1)
+    return rule
+
+@batchRule(validStaffConstraint.MIN_REST)
+def _minRestBatch(key, val):
+    rest = int(val)
+    def rule(occupied):
+        counts = occupied.sum(axis=3)
+        if rest < 1:
+            return np.zeros(len(occupied), dtype=np.int64)
+        _, lookup = _restWindow(rest, occupied.shape[2])
+        seen = (counts > 0)[:, :, lookup]  # (N, W, offsets, days)
+        fails = seen.any(axis=2) & ~(seen[:, :, 0] | seen[:, :, 1])
+        return (counts * fails).sum(axis=(1, 2))
+    return rule
+
+#contraint class defines constraints and contains methods for adding, removing, and checking constraint satisfaction in the current state
+#the checker is compiled from constraintCheckers when the constraint is created (or its value changes)
+class Constraint:
+    __slots__ = ('name', 'ctype', '_val', 'key', 'isGlobal', 'check')
+
+    def __init__(self, name: str, val: float, ctype: constraintType):
+        self.name = name
+        self.ctype = ctype
+        self.val = val
+
+    @property
+    def val(self):
+        return self._val
+
+    @val.setter
+    def val(self, val):
+        self._val = val
+        self._compile()
+
+    def _compile(self):
+        entry = constraintCheckers.get(self.name)
+        if entry is None:
+            name = self.name
+            def check(*args):
+                print(f"unhandled constraint {name}")
                 return True
+            self.key = None
+            self.isGlobal = False
+        else:
+            key, factory = entry
+            check = factory(key, self._val)
+            self.key = key
+            self.isGlobal = isinstance(key, validGlobalConstraint)
+        self.check = check
 
-            # enforce the minimum‐rest window
-            for delta in range(1, int(self.val) + 1):
-                if works(week, day - delta) or works(week, day + delta):
-                    return False
+    # schedule is a ScheduleState, staff rules read the employee-major index rather than scanning the grid
+    def isSatisfied(self, schedule: 'ScheduleState', week: int, day: int, slot: int) -> bool:
+        if self.isGlobal:
+            return self.check(schedule)
 
+        # Skip empty/unfilled for staff rules
+        emp = int(schedule.grid[week, day, slot])
+        if emp == UNFILLED_ID:
             return True
+        return self.check(schedule, emp, week, day, slot)
 
-        # Unknown constraint
-        print(f"unhandled constraint {self.name}")
-        return True
+# employees indexed by their integer id, schedules store ids and look employees up here
+# id 0 is reserved for UNFILLED, every other employee gets the next free id when created
+employeeRegistry: list = [None]
+
+def employeeById(eid) -> 'Employee':
+    return employeeRegistry[int(eid)]
 
 # class to represent employee with constraints to represent employee preferences
+# employees are identified by their integer id, constraints are also kept in a table keyed by
+# validStaffConstraint and split into absolute/relative lists for the solver's hot loops
 class Employee:
+    __slots__ = ('name', 'FTE', 'id', 'constraints', 'table', 'absolute', 'relative', 'totalShifts')
+
     def __init__(self, name: str, FTE: float):
         self.name = name
         self.FTE = FTE
+        if name == 'UNFILLED':
+            self.id = UNFILLED_ID
+            employeeRegistry[UNFILLED_ID] = self
+        else:
+            self.id = len(employeeRegistry)
+            employeeRegistry.append(self)
         self.constraints: list[Constraint] = []
+        self.table: dict[validStaffConstraint, Constraint] = {}
+        self.absolute: list[Constraint] = []
+        self.relative: list[Constraint] = []
         self.totalShifts = 0
         self.setDefaultConstraints()
 
@@ -264,25 +618,52 @@ class Employee:
         return self.name
     
     def __eq__(self, other):
-        return isinstance(other, Employee) and self.name == other.name
+        return self is other
 
     def __hash__(self):
-        return hash(self.name)
+        return self.id
+
+    def _index(self, constraint: Constraint):
+        if constraint.key is not None:
+            self.table.setdefault(constraint.key, constraint)
+        if constraint.ctype == constraintType.ABSOLUTE:
+            self.absolute.append(constraint)
+        else:
+            self.relative.append(constraint)
+
+    def _rebuildTable(self):
+        self.table, self.absolute, self.relative = {}, [], []
+        for c in self.constraints:
+            self._index(c)
 
     def addConstraint(self, key: validStaffConstraint, val, ctype: constraintType):
         constraint = Constraint(key.value, val, ctype)
         self.constraints.append(constraint)
+        self._index(constraint)
 
     def removeConstraint(self, key: validStaffConstraint):
         self.constraints = [c for c in self.constraints if c.name != key.value]
+        self._rebuildTable()
 
     def changeConstraint(self, key: validStaffConstraint, updated: Constraint):
         self.removeConstraint(key)
         self.constraints.append(updated)
+        self._index(updated)
 
     def getConstraints(self) -> list[Constraint]:
         return self.constraints
 
+    # O(1) typed lookup, None if the employee has no such constraint
+    def constraint(self, key: validStaffConstraint) -> Constraint:
+        return self.table.get(key)
+
+    def limit(self, key: validStaffConstraint, default=None):
+        c = self.table.get(key)
+        return default if c is None else c.val
+
+    def hasConstraint(self, key: validStaffConstraint) -> bool:
+        return key in self.table
+
     def setDefaultConstraints(self):
         if self.name == 'UNFILLED':
             return
@@ -347,6 +728,379 @@ class staffRoster(Enum):
     Megan = Employee('Megan', 1)
     Ashley = Employee('Ashley', 1)
 
+# schedule of employee ids with an employee-major index kept in sync on every assignment
+# grid is the slot-major (weeks, days, slots) id array, reads like state[w, d, s] go straight to it
+# writes through state[w, d, s] = id, assign or swap also update the per-employee counts and shift sets,
+# so "where does this employee work" is answered from the index instead of scanning the grid
+# UNFILLED is indexed like any other id, which makes slotsOf(UNFILLED_ID) the set of holes
+# hash is the Zobrist hash of the grid, kept up to date by every assignment, hashAfter gives it for a list of changes
+# begin() opens a move journal: every assignment is recorded as (w, d, s, previous id) so undo() can take the
+# schedule back to the last commit() or to a named savepoint() in time proportional to the slots changed,
+# trial writes that are put back straight away go inside untracked() so they stay out of it
+# watch() hands out a dirty-slot feed, a dict that every later change adds its slot to along with the id the slot held
+# first, so caches over the schedule can refresh just those slots instead of diffing the grid
+class ScheduleState:
+    def __init__(self, grid: np.ndarray):
+        self.grid = np.array(grid, dtype=STATE_DTYPE)
+        W, D, S = self.grid.shape
+        E = max(len(employeeRegistry), int(self.grid.max(initial=0)) + 1)
+        self.dayCount = np.zeros((E, W, D), dtype=np.int8)    # shifts per employee per day
+        self.weekCount = np.zeros((E, W, S), dtype=np.int8)   # shifts per employee per week per slot
+        self.slots: list[set] = [set() for _ in range(E)]     # (w, d, s) worked by each employee
+        self.shiftTree = np.zeros((E, W + 1), dtype=np.int32) # Fenwick tree of shifts per employee per week, see _prefix
+        self.journal = None                                   # (w, d, s, previous id) per assignment while open
+        self.savepoints = {}                                  # name -> journal length
+        self.watchers: list[dict] = []                        # dirty-slot feeds handed out by watch()
+        self.zobrist = zobristKeys(self.grid.shape, E)
+        self.hash = 0
+        for w, d, s in np.ndindex(W, D, S):
+            self._index(int(self.grid[w, d, s]), w, d, s, 1)
+
+    @property
+    def shape(self):
+        return self.grid.shape
+
+    def __getitem__(self, key):
+        return self.grid[key]
+
+    def __setitem__(self, key, eid):
+        w, d, s = key
+        self.assign(w, d, s, eid)
+
+    # NumPy's copy contract: np.array(state) is a copy, np.asarray(state) reads the grid without one
+    def __array__(self, dtype=None, copy=None):
+        if copy is not True and (dtype is None or np.dtype(dtype) == self.grid.dtype):
+            return self.grid
+        if copy is False:
+            raise ValueError(f"ScheduleState cannot be viewed as {dtype} without a copy")
+        return self.grid.copy() if dtype is None else self.grid.astype(dtype)
+
+    def copy(self) -> 'ScheduleState':
+        other = ScheduleState.__new__(ScheduleState)
+        other.grid = self.grid.copy()
+        other.dayCount = self.dayCount.copy()
+        other.weekCount = self.weekCount.copy()
+        other.slots = [set(x) for x in self.slots]
+        other.shiftTree = self.shiftTree.copy()
+        other.journal, other.savepoints = None, {}
+        other.watchers = []
+        other.zobrist, other.hash = self.zobrist, self.hash
+        return other
+
+    def _index(self, eid, w, d, s, step):
+        self.hash ^= int(self.zobrist[eid, w, d, s])
+        self.dayCount[eid, w, d] += step
+        self.weekCount[eid, w, s] += step
+        k = w + 1
+        while k < len(self.shiftTree[0]):
+            self.shiftTree[eid, k] += step
+            k += k & -k
+        if step > 0:
+            self.slots[eid].add((w, d, s))
+        else:
+            self.slots[eid].discard((w, d, s))
+
+    def assign(self, w, d, s, eid):
+        old = int(self.grid[w, d, s])
+        eid = int(eid)
+        if old == eid:
+            return
+        if self.journal is not None:
+            self.journal.append((w, d, s, old))
+        self._set(w, d, s, old, eid)
+
+    # write one slot and keep the index and the watchers' feeds in step, old is the id it holds now
+    def _set(self, w, d, s, old, eid):
+        for dirty in self.watchers:
+            dirty.setdefault((w, d, s), old)
+        self._index(old, w, d, s, -1)
+        self.grid[w, d, s] = eid
+        self._index(eid, w, d, s, 1)
+
+    # a new dirty-slot feed: (w, d, s) -> id the slot held when it first changed since the feed was last cleared
+    # the owner clears it once it has caught up, and hands it back with unwatch() when it stops reading
+    def watch(self) -> dict:
+        dirty = {}
+        self.watchers.append(dirty)
+        return dirty
+
+    def unwatch(self, dirty):
+        self.watchers = [other for other in self.watchers if other is not dirty]
+
+    # hash the grid would have after assigning every (w, d, s, id) of changes, in order, without assigning them
+    def hashAfter(self, changes):
+        h, changed = self.hash, {}
+        for w, d, s, eid in changes:
+            old = changed.get((w, d, s), int(self.grid[w, d, s]))
+            h ^= int(self.zobrist[old, w, d, s]) ^ int(self.zobrist[int(eid), w, d, s])
+            changed[(w, d, s)] = int(eid)
+        return h
+
+    # assign every (w, d, s, id) of changes, in order
+    def apply(self, changes):
+        for w, d, s, eid in changes:
+            self.assign(w, d, s, eid)
+
+    def unassign(self, w, d, s):
+        self.assign(w, d, s, UNFILLED_ID)
+
+    def swap(self, w1, d1, s1, w2, d2, s2):
+        e1, e2 = self.grid[w1, d1, s1], self.grid[w2, d2, s2]
+        self.assign(w1, d1, s1, e2)
+        self.assign(w2, d2, s2, e1)
+
+    # ---- move journal ----
+    def begin(self):
+        self.journal, self.savepoints = [], {}
+
+    # keep every change made so far, undo() now stops here
+    def commit(self):
+        if self.journal is not None:
+            self.journal.clear()
+            self.savepoints.clear()
+
+    def savepoint(self, name):
+        self.savepoints[name] = len(self.journal)
+
+    # revert the changes made since the named savepoint, or since the last commit; later savepoints are dropped
+    def undo(self, savepoint=None):
+        mark = self.savepoints[savepoint] if savepoint is not None else 0
+        journal = self.journal
+        while len(journal) > mark:
+            w, d, s, eid = journal.pop()
+            self._set(w, d, s, int(self.grid[w, d, s]), eid)
+        self.savepoints = {name: at for name, at in self.savepoints.items() if at <= mark}
+
+    # assignments inside the block are not journaled, for trial writes that restore every slot before it ends
+    @contextmanager
+    def untracked(self):
+        journal, self.journal = self.journal, None
+        try:
+            yield self
+        finally:
+            self.journal = journal
+
+    # close the journal, assignments are no longer recorded
+    def end(self):
+        self.journal, self.savepoints = None, {}
+
+    # ---- employee-major queries ----
+    def slotsOf(self, eid) -> set:
+        return self.slots[eid]
+
+    def works(self, eid, w, d) -> bool:
+        return self.dayCount[eid, w, d] > 0
+
+    def shiftsOnDay(self, eid, w, d) -> int:
+        return int(self.dayCount[eid, w, d])
+
+    def dayShifts(self, eid, w) -> int:
+        return int(self.weekCount[eid, w, 0] + self.weekCount[eid, w, 1])
+
+    def nightShifts(self, eid, w) -> int:
+        return int(self.weekCount[eid, w, 2])
+
+    # shifts worked in weeks [0, k), read from the Fenwick tree in O(log W); eid may be an array of ids
+    def _prefix(self, eid, k):
+        total = 0
+        while k > 0:
+            total = total + self.shiftTree[eid, k]
+            k -= k & -k
+        return total
+
+    # shifts worked in weeks [start, end), clipped to the template
+    # eid may be a single id or an array of ids
+    def shiftsInWeeks(self, eid, start, end):
+        W = self.grid.shape[0]
+        start = min(max(start, 0), W)
+        end = min(max(end, start), W)
+        return self._prefix(eid, end) - self._prefix(eid, start)
+
+    def hoursInWeeks(self, eid, start, end):
+        return self.shiftsInWeeks(eid, start, end) * HOURSPERSHIFT
+
+    # hours in the two-week pay period containing week w
+    def payPeriodHours(self, eid, w):
+        start = 2 * (w // 2)
+        return self.hoursInWeeks(eid, start, start + 2)
+
+    # list of 7 bools, True where the employee works that day of week w
+    def workedDays(self, eid, w) -> list:
+        return (self.dayCount[eid, w] > 0).tolist()
+
+    # weeks in which the employee works any weekend shift
+    def weekendWeeks(self, eid) -> list:
+        weekend = self.dayCount[eid, :, weekdays.Saturday.value:weekdays.Sunday.value + 1]
+        return np.flatnonzero(weekend.any(axis=1)).tolist()
+
+# Zobrist keys for grids of one shape: a random 64-bit key per (employee id, week, day, slot), drawn per id from
+# ZOBRIST_SEED so the table can grow with the registry without changing the keys already handed out
+_zobristTables = {}
+
+def zobristKeys(shape, E) -> np.ndarray:
+    keys = _zobristTables.get(shape)
+    if keys is None or len(keys) < E:
+        have = 0 if keys is None else len(keys)
+        extra = [np.random.default_rng((ZOBRIST_SEED, *shape, eid)).integers(0, 2**64, size=shape, dtype=np.uint64)
+                 for eid in range(have, E)]
+        keys = np.stack(extra) if keys is None else np.concatenate([keys, np.stack(extra)])
+        _zobristTables[shape] = keys
+    return keys
+
+# bounded map from schedule hashes to whatever was worked out for that schedule, least recently used out first
+# hits and misses count the get() lookups, to size it by; peek() looks up without counting
+class TranspositionTable:
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    # the entry for key or None, kept as recently used but not counted as a hit or miss
+    def peek(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"{len(self)}/{self.size} states, {self.hits} hits, {self.misses} misses ({rate:.0%} hit rate)"
+
+# wrap a plain id array, ScheduleStates are passed through unchanged
+def asScheduleState(schedule) -> ScheduleState:
+    return schedule if isinstance(schedule, ScheduleState) else ScheduleState(schedule)
+
+# scores placing each of a fixed list of employees into one slot, one array pass per constraint kind
+# constraints are grouped by kind into columns of (employee position, value, absolute) when the batch is built,
+# repeats included so the counts agree with numViolations, so build it once the roster's constraints are final
+# kinds without a placement rule fall back to trial assignment, unhandled constraints always pass
+class CandidateBatch:
+    def __init__(self, employees: list[Employee]):
+        self.employees = list(employees)
+        self.ids = np.array([emp.id for emp in self.employees], dtype=np.intp)
+        columns, self.fallback = {}, []
+        for pos, emp in enumerate(self.employees):
+            for c in emp.getConstraints():
+                if c.key is None:
+                    continue
+                if c.key not in placementRules:
+                    self.fallback.append((pos, c))
+                    continue
+                col = columns.setdefault(c.key, ([], [], []))
+                col[0].append(pos)
+                col[1].append(float(c.val))
+                col[2].append(c.ctype == constraintType.ABSOLUTE)
+        self.columns = [(placementRules[key], self.ids[pos], np.array(vals)) for key, (pos, vals, _) in columns.items()]
+        # the columns laid end to end, matching the concatenated rule outputs in evaluate
+        self.positions = np.array([p for pos, _, _ in columns.values() for p in pos], dtype=np.intp)
+        self.isAbs = np.array([a for _, _, isAbs in columns.values() for a in isAbs], dtype=bool)
+        self.soft = ~self.isAbs & np.array([key is not validStaffConstraint.MINIMUM_HOURS
+                                            for key, (pos, _, _) in columns.items() for _ in pos], dtype=bool)
+
+    # each employee's constraint value for key, default where they have none
+    def limits(self, key: validStaffConstraint, default=np.nan) -> np.ndarray:
+        return np.array([emp.limit(key, default) for emp in self.employees], dtype=float)
+
+    # arrays over employees for placing each of them at (w, d, s):
+    # hardFail (an absolute constraint fails at the slot), absDelta/relDelta (change in their staff violations)
+    # and softFails (relative constraints other than MINIMUM_HOURS failing at the slot)
+    # only meaningful for employees who do not already work day (w, d), callers mask the others out
+    def evaluate(self, state: ScheduleState, w, d, s):
+        n = len(self.employees)
+        results = [rule(state, w, d, s, rows, vals) for rule, rows, vals in self.columns]
+        atSlot = np.concatenate([r[0] for r in results] + [np.zeros(0, dtype=bool)])
+        delta = np.concatenate([r[1] for r in results] + [np.zeros(0, dtype=np.int64)])
+        isAbs, soft, pos = self.isAbs, self.soft, self.positions
+        hardFail = np.bincount(pos[atSlot & isAbs], minlength=n) > 0
+        absDelta = np.bincount(pos[isAbs], delta[isAbs], minlength=n).astype(np.int64)
+        relDelta = np.bincount(pos[~isAbs], delta[~isAbs], minlength=n).astype(np.int64)
+        softFails = np.bincount(pos[soft], atSlot[soft], minlength=n).astype(np.int64)
+
+        for pos, c in self.fallback:
+            eid = int(self.ids[pos])
+            if state.works(eid, w, d):
+                continue
+            before = sum(not c.isSatisfied(state, *slot) for slot in list(state.slotsOf(eid)))
+            orig = int(state.grid[w, d, s])
+            with state.untracked():
+                state.assign(w, d, s, eid)
+                fails = not c.isSatisfied(state, w, d, s)
+                after = sum(not c.isSatisfied(state, *slot) for slot in list(state.slotsOf(eid)))
+                state.assign(w, d, s, orig)
+            if c.ctype == constraintType.ABSOLUTE:
+                hardFail[pos] |= fails
+                absDelta[pos] += after - before
+            else:
+                relDelta[pos] += after - before
+                softFails[pos] += fails and c.key is not validStaffConstraint.MINIMUM_HOURS
+        return hardFail, absDelta, relDelta, softFails
+
+# min-cost flow by successive shortest paths, Bellman-Ford (queue based) so costs may be negative
+# nodes are any hashable values, edges are stored in pairs: edge i and its reverse i ^ 1
+# minCostFlow augments along the cheapest path for as long as that path has negative cost, so the amount sent is
+# whichever makes the total cost lowest, not the maximum flow
+class FlowNetwork:
+    def __init__(self):
+        self.edges = {}  # node -> indices of the edges leaving it
+        self.head, self.cap, self.cost = [], [], []
+
+    def addEdge(self, u, v, cap, cost) -> int:
+        for a, b, c, k in ((u, v, cap, cost), (v, u, 0, -cost)):
+            self.edges.setdefault(a, []).append(len(self.head))
+            self.head.append(b)
+            self.cap.append(c)
+            self.cost.append(k)
+        return len(self.head) - 2
+
+    def flow(self, edge) -> int:
+        return self.cap[edge ^ 1]
+
+    def minCostFlow(self, source, sink) -> int:
+        total = 0
+        while True:
+            dist, via = {source: 0}, {}
+            queue, queued = deque([source]), {source}
+            while queue:
+                u = queue.popleft()
+                queued.discard(u)
+                for e in self.edges.get(u, ()):
+                    v = self.head[e]
+                    if self.cap[e] > 0 and dist[u] + self.cost[e] < dist.get(v, float('inf')):
+                        dist[v], via[v] = dist[u] + self.cost[e], e
+                        if v not in queued:
+                            queued.add(v)
+                            queue.append(v)
+            if dist.get(sink, 0) >= 0:
+                return total
+            path, v = [], sink
+            while v != source:
+                path.append(via[v])
+                v = self.head[via[v] ^ 1]
+            push = min(self.cap[e] for e in path)
+            for e in path:
+                self.cap[e] -= push
+                self.cap[e ^ 1] += push
+            total += push * dist[sink]
+
 # class contains methods to set and monitor global constraints, print the current state, and find/print/return current state constraint violations
 class ScheduleBalancer:
     def __init__(self, state: np.ndarray, daypool: list[Employee],nightpool: list[Employee], floatpool: list[Employee], unfilled: list[Employee]):
@@ -371,9 +1125,9 @@ class ScheduleBalancer:
             for week in range(state.shape[0]):
                 string += f"Week: {week}\n"
                 for day in range(7):
-                    d1 = state[week, day, 0]
-                    d2 = state[week, day, 1]
-                    n = state[week, day, 2]
+                    d1 = employeeById(state[week, day, 0])
+                    d2 = employeeById(state[week, day, 1])
+                    n = employeeById(state[week, day, 2])
                     string += f"Day {day}: {d1},{d2} | Night: {n}\n"
             return string
         except Exception as e:
@@ -385,7 +1139,7 @@ class ScheduleBalancer:
     #separate the relative constraint violations, this should only check if the schedule is valid (ie: no absolute violations)
     def isValidSchedule(self, schedule=None):
         
-        sched = schedule if schedule is not None else self.state
+        sched = asScheduleState(schedule if schedule is not None else self.state)
         W,D,S = sched.shape
         globalAbsViolation = globalRelViolation = staffAbsViolation = staffRelViolation = 0
         violations = []
@@ -394,22 +1148,17 @@ class ScheduleBalancer:
             if c.ctype == constraintType.ABSOLUTE and not ok:
                 return False
         
-        for w in range(W):
-            for d in range(D):
-                for s in range(S):
-                    emp = sched[w,d,s]
-                    if emp is None or emp.name=='UNFILLED':
-                        continue
-                    for c in emp.getConstraints():
-                        ok = c.isSatisfied(sched, w, d, s)
-                        if c.ctype == constraintType.ABSOLUTE and not ok:
-                            return False
+        for w, d, s in np.argwhere(sched.grid != UNFILLED_ID).tolist():
+            emp = employeeById(sched[w,d,s])
+            for c in emp.absolute:
+                if not c.isSatisfied(sched, w, d, s):
+                    return False
 
         return True
 
     def numViolations(self, schedule=None):
         
-        sched = schedule if schedule is not None else self.state
+        sched = asScheduleState(schedule if schedule is not None else self.state)
         W,D,S = sched.shape
         globalAbsViolation = globalRelViolation = staffAbsViolation = staffRelViolation = 0
         violations = []
@@ -422,23 +1171,83 @@ class ScheduleBalancer:
                 globalRelViolation += 1
                 violations.append(f"global relative violation {c.name}")
         
-        for w in range(W):
-            for d in range(D):
-                for s in range(S):
-                    emp = sched[w,d,s]
-                    if emp is None or emp.name=='UNFILLED':
-                        continue
-                    for c in emp.getConstraints():
-                        ok = c.isSatisfied(sched, w, d, s)
-                        if c.ctype == constraintType.ABSOLUTE and not ok:
-                            staffAbsViolation +=1
-                            violations.append(f"{emp} absolute violation {c.name} on {w}{d}{s}")
-                        elif c.ctype == constraintType.RELATIVE and not ok:
-                            staffRelViolation +=1
-                            violations.append(f"{emp} relative violation {c.name} on {w}{d}{s}")
+        # only filled slots carry staff constraints
+        for w, d, s in np.argwhere(sched.grid != UNFILLED_ID).tolist():
+            emp = employeeById(sched[w,d,s])
+            for c in emp.getConstraints():
+                ok = c.isSatisfied(sched, w, d, s)
+                if c.ctype == constraintType.ABSOLUTE and not ok:
+                    staffAbsViolation +=1
+                    violations.append(f"{emp} absolute violation {c.name} on {w}{d}{s}")
+                elif c.ctype == constraintType.RELATIVE and not ok:
+                    staffRelViolation +=1
+                    violations.append(f"{emp} relative violation {c.name} on {w}{d}{s}")
 
         return globalAbsViolation, globalRelViolation, staffAbsViolation, staffRelViolation, violations
     
+    # numViolations' four counts for a stack of N schedules, (N, W, 7, 3) ids, as four (N,) arrays
+    # every constraint is counted over the whole stack at once by its batchRules entry, constraints without one are
+    # checked schedule by schedule as numViolations does
+    def batchViolations(self, schedules):
+        grids = np.asarray(schedules, dtype=STATE_DTYPE)
+        counts = np.zeros((4, len(grids)), dtype=np.int64)  # global abs, global rel, staff abs, staff rel
+        states = []
+
+        def perSchedule(c, slotsOf):
+            if not states:
+                states.extend(ScheduleState(grid) for grid in grids)
+            return np.array([sum(not c.isSatisfied(state, *slot) for slot in slotsOf(state)) for state in states])
+
+        def add(c, fails, globalRow):
+            if c.ctype == constraintType.ABSOLUTE:
+                counts[globalRow] += fails
+            elif c.ctype == constraintType.RELATIVE:
+                counts[globalRow + 1] += fails
+
+        for c in self.constraints:
+            if c.key in batchRules:
+                add(c, ~batchRules[c.key](c.key, c.val)(grids), 0)
+            else:
+                add(c, perSchedule(c, lambda state: [(None, None, None)]), 0)
+        for eid in np.unique(grids):
+            if eid == UNFILLED_ID:
+                continue
+            occupied = grids == eid
+            for c in employeeById(eid).getConstraints():
+                if c.key in batchRules:
+                    add(c, batchRules[c.key](c.key, c.val)(occupied), 2)
+                else:
+                    add(c, perSchedule(c, lambda state: list(state.slotsOf(eid))), 2)
+        return tuple(counts)
+
+    # absolute and relative violation counts of the global constraints
+    def globalViolations(self, schedule):
+        absV = relV = 0
+        for c in self.constraints:
+            if not c.isSatisfied(schedule, None, None, None):
+                if c.ctype == constraintType.ABSOLUTE:
+                    absV += 1
+                else:
+                    relV += 1
+        return absV, relV
+
+    # absolute and relative staff violations counted on one employee's slots within the given weeks
+    # summing this over every employee and every week gives the staff counts of numViolations
+    def employeeViolations(self, schedule, eid, weeks):
+        emp = employeeById(eid)
+        weeks = set(weeks)
+        absV = relV = 0
+        for w, d, s in schedule.slotsOf(eid):
+            if w not in weeks:
+                continue
+            for c in emp.getConstraints():
+                if not c.isSatisfied(schedule, w, d, s):
+                    if c.ctype == constraintType.ABSOLUTE:
+                        absV += 1
+                    else:
+                        relV += 1
+        return absV, relV
+
     #separate the relative constraint violations, this should only check if the schedule is valid (ie: no absolute violations)
     def printViolations(self, schedule=None):
         globalAbsViolation, globalRelViolation, staffAbsViolation, staffRelViolation, violations = self.numViolations(schedule)
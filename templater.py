@@ -1,17 +1,29 @@
 import numpy as np
 
-from Solver import Solver
+from Solver import Solver, CONSTRUCTION
 from helpers import (
     weekdays,
     staffRoster,
     ScheduleBalancer,
-    validStaffConstraint
+    validStaffConstraint,
+    employeeById,
+    asScheduleState,
+    UNFILLED_ID,
+    STATE_DTYPE,
 )
 import matplotlib.pyplot as pp
 import pandas as pd
 from openpyxl.utils import get_column_letter
 import pandas as pd
 from openpyxl import load_workbook
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import queue
+import contextlib
+import os
+import random
+import statistics
+import time
 
 #change PATHIN if you want to read from a different template using .xlsx
 #another option is to use the startingTemplate.csv, which is a rough sketch of the template <- requires that undo the comment out of the import_schedule_from_csv method
@@ -22,6 +34,14 @@ WEEKS = 12 # if reading from xlsx this needs to be exactly the same number of we
 SHIFTLENGTH = 12 #hours
 NUM_SHIFTS = 3  # D1, D2, N
 DAYS_PER_WEEK = 7
+RUNS = 1  # independent solver runs, more than 1 spreads them over a process pool (see multiStart)
+WORKERS = None  # processes for multiStart, None uses every core
+PORTFOLIO = []  # strategies for portfolio() to race instead, e.g. ['anneal', 'descent', 'reconstruct']
+TIME_BUDGET = 120  # seconds a portfolio race may run, checked between rounds
+TARGET_SCORE = 0  # a portfolio race stops as soon as any worker reaches this score
+RUIN = 0.2  # share of filled weekday slots the 'reconstruct' strategy clears before rebuilding
+POPULATION = 0  # schedules memetic() evolves, more than 1 runs it instead of a single solve
+GENERATIONS = 10  # rounds of crossover and repair in memetic()
 
 # class with functions to initialize a blank or partially-filled schedule, assign weekends by rotation, import and export schedule templates
 # employees are created with constraints from helpers.py, sorted into pools based on day-night shift preference
@@ -43,12 +63,10 @@ class Templater:
             can_do_days = True
 
             # Check for day/night shift restrictions (0 shifts per week)
-            for c in emp.getConstraints():
-                if emp.name == "UNFILLED":
-                    continue
-                if c.name == validStaffConstraint.NIGHTSHIFTS_PER_WEEK.value and c.val == 0:
+            if emp.name != "UNFILLED":
+                if emp.limit(validStaffConstraint.NIGHTSHIFTS_PER_WEEK) == 0:
                     can_do_nights = False
-                if c.name == validStaffConstraint.DAYSHIFTS_PER_WEEK.value and c.val == 0:
+                if emp.limit(validStaffConstraint.DAYSHIFTS_PER_WEEK) == 0:
                     can_do_days = False
 
             if can_do_days and not can_do_nights:
@@ -94,45 +112,45 @@ class Templater:
                     if night_rotation:
                         emp_n = night_rotation[0]
                         night_rotation.pop(0)
-                        schedule[w,d,2] = emp_n
+                        schedule[w,d,2] = emp_n.id
                         night_rotation.append(emp_n)
                     else:
                         print("night pool empty")
                         exit(1)
-                        schedule[w,d,2] = self.unfilled
+                        schedule[w,d,2] = UNFILLED_ID
 
-                    schedule[w,d,1] = self.unfilled 
+                    schedule[w,d,1] = UNFILLED_ID 
 
                     if w % 2 == 0: # Even week: David + one other for day shifts
-                        schedule[w,d,0] = self.david # David is D1
+                        schedule[w,d,0] = self.david.id # David is D1
                         
                         if day_rotation:
                             other_emp_d2 = day_rotation[0]
                             day_rotation.pop(0)
-                            schedule[w,d,1] = other_emp_d2 # Other person is D2
+                            schedule[w,d,1] = other_emp_d2.id # Other person is D2
                             day_rotation.append(other_emp_d2)
                         else:
                             print("day pool empty")
                             exit(1)
-                            schedule[w,d,1] = self.unfilled # Fallback if day pool empty
+                            schedule[w,d,1] = UNFILLED_ID # Fallback if day pool empty
 
                     else: # Odd week: One other person + UNFILLED for day shifts
                         if day_rotation:
                             other_emp_d1 = day_rotation[0]
                             day_rotation.pop(0)
-                            schedule[w,d,0] = other_emp_d1 # Other person is D1
+                            schedule[w,d,0] = other_emp_d1.id # Other person is D1
                             day_rotation.append(other_emp_d1)
                         else:
                             print("day pool empty")
                             exit(2)
-                            schedule[w,d,0] = self.unfilled # Fallback if day pool empty
+                            schedule[w,d,0] = UNFILLED_ID # Fallback if day pool empty
                         
         return schedule
 
     #takes number of desired weeks, creates
     def makeTemplate(self, numWeeks: int, fill=False) -> np.ndarray:
         weeks, days, slots = numWeeks, 7, 3
-        schedule = np.empty((weeks, days, slots), dtype=object)
+        schedule = np.full((weeks, days, slots), UNFILLED_ID, dtype=STATE_DTYPE)
 
         if fill:
             schedule = self.import_schedule_from_csv()
@@ -145,10 +163,10 @@ class Templater:
                     continue
                 #unfill all weekdays
                 for slot in range(3):
-                    schedule[week,day,slot] = self.unfilled
+                    schedule[week,day,slot] = UNFILLED_ID
                 #every other week, assign david to d2 on wednesday
                 if week % 2 == 0 and day in [weekdays.Wednesday.value]:
-                     schedule[week,day,1] = self.david
+                     schedule[week,day,1] = self.david.id
 
         #fill the weekends
         schedule = self.fillWeekends(schedule)
@@ -156,13 +174,13 @@ class Templater:
         return schedule
 
     # import schedule from .xlsx on PATHIN
-    # return state as numpy array
+    # return state as numpy array of employee ids
     # assumes the format of cells is exactly the same as the export function
     def import_schedule_from_xlsx(self, fill_weekends=False) -> np.ndarray:
         W, D, S = WEEKS, 7, 3
-        schedule = np.empty((W, D, S), dtype=object)
-        name_map = {e.name: e for e in self.employees}
-        name_map[''] = self.unfilled 
+        schedule = np.full((W, D, S), UNFILLED_ID, dtype=STATE_DTYPE)
+        name_map = {e.name: e.id for e in self.employees}
+        name_map[''] = UNFILLED_ID 
 
         wb = load_workbook(PATHIN, data_only=True)
         ws = wb['Master']
@@ -187,7 +205,7 @@ class Templater:
                 for d in range(D):
                     cell = ws.cell(row=row_idx, column=d+2)
                     name = cell.value if cell.value is not None else ''
-                    emp = name_map.get(name, self.unfilled)
+                    emp = name_map.get(name, UNFILLED_ID)
                     schedule[w, d, shift_idx] = emp
         
         if fill_weekends:
@@ -195,10 +213,9 @@ class Templater:
 
         return schedule
 
-    # export schedule from state to PATHOUT
+    # export schedule from state to PATHOUT, ids are mapped back to names here
     def export_schedule_to_xlsx(self, schedule: np.ndarray):
         W, _, _ = schedule.shape
-        SHIFT_HOURS = 12
         day_names = ['Mo','Tu','We','Th','Fr','Sa','Su']
 
         tables = {}
@@ -207,7 +224,7 @@ class Templater:
             for w in range(W):
                 row = []
                 for d in range(7):
-                    row.append(schedule[w,d,idx].name if schedule[w,d,idx].name!='UNFILLED' else '')
+                    row.append(employeeById(schedule[w,d,idx]).name if schedule[w,d,idx]!=UNFILLED_ID else '')
                 data.append(row)
 
             while len(data) < W:
@@ -215,22 +232,17 @@ class Templater:
 
             tables[label] = pd.DataFrame(data, columns=day_names).assign(Week=lambda df: df.index + 1).set_index('Week')
 
-        all_emps = {e for e in schedule.flatten() if e.name!='UNFILLED'}
+        all_emps = {employeeById(e) for e in np.unique(schedule) if e!=UNFILLED_ID}
+        state = asScheduleState(schedule)
         summary_rows = []
         for emp in sorted(all_emps, key=lambda e: e.name):
-            total_hours = day_shifts = night_shifts = weekday_days = weekend_days = 0
+            total_hours = int(state.hoursInWeeks(emp.id, 0, W))
+            day_shifts = night_shifts = weekday_days = weekend_days = 0
             for w in range(W):
+                day_shifts += state.dayShifts(emp.id, w)
+                night_shifts += state.nightShifts(emp.id, w)
                 for d in range(7):
-                    worked = False
-                    for s in range(3):
-                        if schedule[w,d,s] is emp:
-                            worked = True
-                            total_hours += SHIFT_HOURS
-                            if s in (0,1):
-                                day_shifts += 1
-                            else:
-                                night_shifts += 1
-                    if worked:
+                    if state.works(emp.id, w, d):
                         if d in (weekdays.Saturday.value, weekdays.Sunday.value):
                             weekend_days += 1
                         else:
@@ -254,17 +266,15 @@ class Templater:
         for emp in sorted(all_emps, key=lambda e: e.name):
             rows = []
             for w in range(W):
-                week_hours = 0
                 week_row = []
                 for d in range(7):
                     slot = ''
                     for s,label in [(0,'D1'),(1,'D2'),(2,'N')]:
-                        if schedule[w,d,s] is emp:
+                        if schedule[w,d,s] == emp.id:
                             slot = label
-                            week_hours += SHIFT_HOURS
                             break
                     week_row.append(slot)
-                rows.append([w+1] + week_row + [week_hours])
+                rows.append([w+1] + week_row + [int(state.hoursInWeeks(emp.id, w, w + 1))])
             personal_dfs[emp.name] = pd.DataFrame(
                 rows,
                 columns=['Week'] + day_names + ['Hours']
@@ -341,7 +351,7 @@ class Templater:
     #integer representation compared to employeeMap, which was coded with known length of each employee pool
     #if needed in the future, carefully inspect the length in each pool and extend the employee map as needed
     #read from STARTERPATHIN
-    #return state as numpy array
+    #return state as numpy array of employee ids
     def import_schedule_from_csv(self) -> np.ndarray:
         
         df = pd.read_csv(STARTERPATHIN, header=None)
@@ -350,14 +360,14 @@ class Templater:
 
         #this is hard coded map representation, change as needed for future implementation
         employeeMap = {
-            0: self.unfilled,
-            1: self.night_pool[0],
-            2: self.night_pool[1],
-            3: self.float_pool[0],
-            4: self.float_pool[1],
-            5: daypool[0],
-            6: daypool[1],
-            7: self.david
+            0: self.unfilled.id,
+            1: self.night_pool[0].id,
+            2: self.night_pool[1].id,
+            3: self.float_pool[0].id,
+            4: self.float_pool[1].id,
+            5: daypool[0].id,
+            6: daypool[1].id,
+            7: self.david.id
         }
 
         num_weeks = df.shape[0] // NUM_SHIFTS
@@ -374,13 +384,13 @@ class Templater:
                 for shift in range(NUM_SHIFTS):
                     value = df.iloc[start_row + shift, day]
                     if pd.isna(value):
-                        day_shift.append(self.unfilled)
+                        day_shift.append(UNFILLED_ID)
                     else:
-                        day_shift.append(employeeMap.get(int(value), None))
+                        day_shift.append(employeeMap.get(int(value), UNFILLED_ID))
                 week_schedule.append(day_shift)
             
             schedule.append(week_schedule)
-        schedule = np.array(schedule)
+        schedule = np.array(schedule, dtype=STATE_DTYPE)
 
         return schedule
 
@@ -393,6 +403,240 @@ def createFigure(epochs, scores):
     pp.ylabel("Score")
     pp.show()
 
+# one full stateHandler pipeline from initial_schedule with its own seed, run in a worker process
+# the roster is rebuilt in the worker, and the solver's progress output is dropped so parallel runs don't interleave
+def _solveRun(initial_schedule, seed, construction):
+    templater = Templater()
+    balancer = ScheduleBalancer(np.array(initial_schedule), templater.day_pool, templater.night_pool,
+                                templater.float_pool, templater.unfilled)
+    agent = Solver(balancer, templater.day_pool, templater.night_pool, templater.float_pool, templater.unfilled, seed=seed)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        schedule, score, epochs, scores = agent.stateHandler(construction)
+    return seed, int(score), time.perf_counter() - start, schedule, epochs, scores
+
+# solve initial_schedule once per seed across a process pool and keep the best template (lowest score, earliest seed on ties)
+# seeds default to fresh random ones, each run's seed, score and wall time are printed so any of them can be rerun
+# with Solver(..., seed=seed); returns stateHandler's (schedule, score, epochs, scores) for the winner, plus
+# (seed, score, seconds) for every run in seed order
+def multiStart(initial_schedule, runs=RUNS, seeds=None, workers=WORKERS, construction=CONSTRUCTION):
+    if seeds is None:
+        seeds = [random.SystemRandom().randrange(2**32) for _ in range(runs)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_solveRun, np.asarray(initial_schedule), seed, construction) for seed in seeds]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    print(f"\n--- Multi-start: {len(results)} runs in {elapsed:.1f}s ---")
+    for seed, score, seconds, *_ in results:
+        print(f"  seed {seed:>10}: score {score:>8}  {seconds:6.1f}s")
+    finals = [r[1] for r in results]
+    print(f"Scores: min {min(finals)}, median {statistics.median(finals)}, mean {statistics.mean(finals):.1f}, max {max(finals)}")
+    seed, score, _, schedule, epochs, scores = min(results, key=lambda r: r[1])
+    print(f"Best score {score} from seed {seed}")
+    return schedule, score, epochs, scores, [r[:3] for r in results]
+
+# portfolio strategies, each a function (agent, start schedule) -> (schedule, score) for one round
+# anneal: the full stateHandler pipeline, descent: repair, fill and sweep only, reconstruct: clear RUIN of the filled
+# weekday slots at random and rebuild them by regret before repairing
+def _annealRound(agent, start):
+    agent.reset(start)
+    return agent.stateHandler('anneal')[:2]
+
+def _descentRound(agent, start):
+    agent.reset(start)
+    return agent.stateHandler('none')[:2]
+
+def _reconstructRound(agent, start):
+    agent.reset(_ruin(start, agent.random))
+    return agent.stateHandler('regret')[:2]
+
+# copy of schedule with RUIN of its filled weekday slots cleared at random
+def _ruin(schedule, rng):
+    ruined = np.array(schedule)
+    filled = [slot for slot in np.argwhere(ruined != UNFILLED_ID).tolist()
+              if slot[1] not in (weekdays.Saturday.value, weekdays.Sunday.value)]
+    for w, d, s in rng.sample(filled, int(RUIN * len(filled))):
+        ruined[w, d, s] = UNFILLED_ID
+    return ruined
+
+portfolioStrategies = {'anneal': _annealRound, 'descent': _descentRound, 'reconstruct': _reconstructRound}
+
+# one portfolio worker: runs rounds of its strategy until the race stops or the deadline passes
+# each round starts from the shared incumbent when that beats the worker's own best, otherwise from its own best;
+# descent is deterministic, so it only runs again once there is a new starting point
+# improvements are published to the incumbent under its lock, reaching target stops every worker
+# initial_score is Solver.score of initial_schedule, which the worker's own best starts from
+def _portfolioWorker(strategy, initial_schedule, initial_score, seed, incumbent, stop, deadline, target, report):
+    best_score, best_grid = incumbent
+    shared = np.frombuffer(best_grid.get_obj(), dtype=STATE_DTYPE).reshape(np.shape(initial_schedule))
+    own_grid, own_score = np.array(initial_schedule), initial_score
+    start = time.perf_counter()
+    rounds = adopted = 0
+    published, last_start = [], None
+
+    try:
+        templater = Templater()
+        balancer = ScheduleBalancer(np.array(initial_schedule), templater.day_pool, templater.night_pool,
+                                    templater.float_pool, templater.unfilled)
+        agent = Solver(balancer, templater.day_pool, templater.night_pool, templater.float_pool, templater.unfilled,
+                       seed=seed)
+        with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+            while not stop.is_set() and time.time() < deadline:
+                with best_score.get_lock():
+                    shared_score, shared_grid = best_score.value, shared.copy()
+                adopting = shared_score < own_score
+                begin = shared_grid if adopting else own_grid
+                if strategy == 'descent' and last_start is not None and np.array_equal(begin, last_start):
+                    stop.wait(0.05)
+                    continue
+                last_start = begin
+                rounds += 1
+                adopted += adopting
+
+                grid, score = portfolioStrategies[strategy](agent, begin)
+                if score < own_score:
+                    own_grid, own_score = np.array(grid), score
+                with best_score.get_lock():
+                    if score < best_score.value:
+                        best_score.value = int(score)
+                        shared[...] = grid
+                        published.append((time.perf_counter() - start, int(score)))
+                if score <= target:
+                    stop.set()
+    finally:
+        # report even if the worker fails, so portfolio() is not left waiting
+        report.put((strategy, seed, rounds, adopted, published, int(own_score), time.perf_counter() - start))
+
+# race several strategies from portfolioStrategies on initial_schedule, one worker process each
+# workers share a best-so-far incumbent and adopt it when it beats their own, the race ends when any worker reaches
+# target or time_budget runs out (workers finish their current round first)
+# the incumbent starts as initial_schedule at its own score, so the input comes back when no round beats it in time;
+# a worker that dies without reporting is named and left out of the per-worker results
+# returns stateHandler's (schedule, score, epochs, scores) for the incumbent, where the history is every improvement
+# to it in order, plus (strategy, seed, rounds, improvements published, best own score, seconds) per worker
+def portfolio(initial_schedule, strategies=PORTFOLIO, seeds=None, time_budget=TIME_BUDGET, target=TARGET_SCORE):
+    unknown = set(strategies) - set(portfolioStrategies)
+    if unknown or not strategies:
+        raise ValueError(f"unknown portfolio strategies {sorted(unknown)}, expected some of {sorted(portfolioStrategies)}")
+    if seeds is None:
+        seeds = [random.SystemRandom().randrange(2**32) for _ in strategies]
+    initial_schedule = np.asarray(initial_schedule, dtype=STATE_DTYPE)
+    templater = Templater()
+    balancer = ScheduleBalancer(np.array(initial_schedule), templater.day_pool, templater.night_pool,
+                                templater.float_pool, templater.unfilled)
+    initial_score = int(Solver(balancer, templater.day_pool, templater.night_pool, templater.float_pool,
+                               templater.unfilled).current_score)
+    incumbent = (multiprocessing.Value('q', initial_score), multiprocessing.Array('h', initial_schedule.ravel().tolist()))
+    stop, report = multiprocessing.Event(), multiprocessing.Queue()
+    deadline = time.time() + time_budget
+    start = time.perf_counter()
+    workers = [multiprocessing.Process(target=_portfolioWorker,
+                                       args=(strategy, initial_schedule, initial_score, seed, incumbent, stop, deadline,
+                                             target, report))
+               for strategy, seed in zip(strategies, seeds)]
+    for worker in workers:
+        worker.start()
+    stop.wait(time_budget)
+    stop.set()
+    # a killed worker never reports, so stop waiting once every worker has exited and the queue stays empty
+    results = []
+    while len(results) < len(workers):
+        try:
+            results.append(report.get(timeout=1))
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+    for worker in workers:
+        worker.join()
+    reported = {(strategy, seed) for strategy, seed, *_ in results}
+    for worker, strategy, seed in zip(workers, strategies, seeds):
+        if (strategy, seed) not in reported:
+            print(f"Portfolio worker {strategy} (seed {seed}) exited with code {worker.exitcode} without reporting")
+    elapsed = time.perf_counter() - start
+
+    best_score, best_grid = incumbent
+    schedule = np.frombuffer(best_grid.get_obj(), dtype=STATE_DTYPE).reshape(initial_schedule.shape).copy()
+    improvements = sorted((at, score, strategy) for strategy, _, _, _, published, _, _ in results for at, score in published)
+    print(f"\n--- Portfolio: {len(workers)} workers in {elapsed:.1f}s ---")
+    for strategy, seed, rounds, adopted, published, own, seconds in results:
+        print(f"  {strategy:>11} (seed {seed}): {rounds} rounds, adopted {adopted}, published {len(published)}, "
+              f"best {own}, {seconds:.1f}s")
+    print(f"Best score {best_score.value} from {improvements[-1][2] if improvements else 'none'}")
+    scores = [score for _, score, _ in improvements]
+    return schedule, best_score.value, list(range(1, len(scores) + 1)), scores, \
+        [(strategy, seed, rounds, len(published), own, seconds)
+         for strategy, seed, rounds, _, published, own, seconds in results]
+
+# one memetic child: repair_schedule from the crossed-over grid in a worker process, keeping the crossover itself
+# if the repair makes it worse; returns (schedule, score)
+def _repairChild(child, seed):
+    templater = Templater()
+    balancer = ScheduleBalancer(np.array(child), templater.day_pool, templater.night_pool,
+                                templater.float_pool, templater.unfilled)
+    agent = Solver(balancer, templater.day_pool, templater.night_pool, templater.float_pool, templater.unfilled, seed=seed)
+    crossed = int(agent.current_score)
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        repaired, *_ = agent.repair_schedule([], [])
+    score = int(agent.score(repaired))
+    if score > crossed:
+        return np.array(child), crossed
+    return np.array(repaired.grid), score
+
+# child of two parents: every pay period (or every week, chosen per child) is copied whole from one parent or the other,
+# so most constraint scopes come from a single parent; at least one block comes from each
+def _crossover(first, second, rng):
+    weeks = first.shape[0]
+    size = rng.choice((1, 2))
+    blocks = [range(start, min(start + size, weeks)) for start in range(0, weeks, size)]
+    picks = [rng.random() < 0.5 for _ in blocks]
+    if len(blocks) > 1 and len(set(picks)) == 1:
+        picks[rng.randrange(len(blocks))] ^= True
+    child = np.array(first)
+    for block, fromSecond in zip(blocks, picks):
+        if fromSecond:
+            child[list(block)] = second[list(block)]
+    return child
+
+# memetic search: a population of POPULATION full pipeline runs (all but the first from a _ruin of the input, so a
+# schedule the pipeline always solves the same way still gives a varied population), then GENERATIONS rounds in which parents picked by
+# binary tournament are crossed over on week or pay-period blocks and every child is repaired in parallel
+# each round keeps the best POPULATION distinct schedules of parents and children together
+# returns stateHandler's (schedule, score, epochs, scores) for the best schedule, where the history is the best score
+# after each generation, plus the final population's scores
+def memetic(initial_schedule, population=POPULATION, generations=GENERATIONS, seed=None, workers=WORKERS,
+            construction=CONSTRUCTION):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        starts = [np.asarray(initial_schedule)] + [_ruin(initial_schedule, rng) for _ in range(population - 1)]
+        futures = [pool.submit(_solveRun, begin, rng.randrange(2**32), construction) for begin in starts]
+        members = [(score, np.asarray(schedule)) for _, score, _, schedule, *_ in (f.result() for f in futures)]
+        members.sort(key=lambda member: member[0])
+        history = [members[0][0]]
+        print(f"Generation 0: best {members[0][0]}, mean {statistics.mean(m[0] for m in members):.1f}")
+
+        for generation in range(1, generations + 1):
+            def tournament():
+                return min(rng.sample(members, min(2, len(members))), key=lambda member: member[0])[1]
+            children = [_crossover(tournament(), tournament(), rng) for _ in range(population)]
+            futures = [pool.submit(_repairChild, child, rng.randrange(2**32)) for child in children]
+            offspring = [(score, schedule) for schedule, score in (f.result() for f in futures)]
+
+            survivors, seen = [], set()
+            for score, schedule in sorted(members + offspring, key=lambda member: member[0]):
+                if schedule.tobytes() not in seen:
+                    seen.add(schedule.tobytes())
+                    survivors.append((score, schedule))
+            members = survivors[:population]
+            history.append(members[0][0])
+            print(f"Generation {generation}: best {members[0][0]}, mean {statistics.mean(m[0] for m in members):.1f}")
+
+    print(f"Memetic search: {generations} generations of {population} in {time.perf_counter() - start:.1f}s, "
+          f"best score {members[0][0]}")
+    return members[0][1], members[0][0], list(range(len(history))), history, [score for score, _ in members]
+
 #feasibility check to quick fail an unsolvable problem
 def isFeasible(employees, total_weeks=WEEKS):
     num_even_weeks = total_weeks // 2
@@ -405,7 +649,7 @@ def isFeasible(employees, total_weeks=WEEKS):
     required_hours = total_required_shifts * SHIFTLENGTH
 
     total_available_hours = sum(
-        next(c.val for c in emp.getConstraints() if c.name == validStaffConstraint.HOURS_PER_PAY_PERIOD.value) * (total_weeks // 2)
+        emp.limit(validStaffConstraint.HOURS_PER_PAY_PERIOD) * (total_weeks // 2)
         for emp in employees if emp.name != "UNFILLED"
     )
 
@@ -442,7 +686,14 @@ if __name__ == "__main__":
     if not isFeasible(employees):
         exit(0)
 
-    schedule, final_score, epochs, scores = agent.stateHandler()
+    if PORTFOLIO:
+        schedule, final_score, epochs, scores, _ = portfolio(initial_schedule)
+    elif POPULATION > 1:
+        schedule, final_score, epochs, scores, _ = memetic(initial_schedule)
+    elif RUNS > 1:
+        schedule, final_score, epochs, scores, _ = multiStart(initial_schedule)
+    else:
+        schedule, final_score, epochs, scores = agent.stateHandler()
     
     # ---------------------------------- EVAL AND PRINTING FUNCTIONS -------------------------------------------
 
@@ -464,25 +715,14 @@ if __name__ == "__main__":
 
     #hours count per employee per week
     weeks, days, slots = schedule.shape
+    hours = asScheduleState(schedule)
     for emp in employees:
-        total_hours = 0
-        for week in range(weeks):
-            for day in range(7):
-                for slot in range(3):
-                    if schedule[week, day, slot] is emp:
-                        total_hours += SHIFTLENGTH
-        print(f"{emp.name}: {total_hours} hrs worked total")
+        print(f"{emp.name}: {hours.hoursInWeeks(emp.id, 0, weeks)} hrs worked total")
 
     for emp in employees:
         print(f"{emp.name}:")
         for pay_start in range(0, weeks, 2):
-            total_hours = 0
-            for w in range(pay_start, min(pay_start+2, weeks)):
-                for d in range(7):
-                    for s in range(3):
-                        if schedule[w, d, s] is emp:
-                            total_hours += SHIFTLENGTH
-            print(f"  Weeks {pay_start}-{pay_start+1}: {total_hours} hrs")
+            print(f"  Weeks {pay_start}-{pay_start+1}: {hours.payPeriodHours(emp.id, pay_start)} hrs")
     
     #print figure
     #createFigure(epochs, scores)